@@ -0,0 +1,760 @@
+#! /usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import blobs
+import colour_lut
+import frame_context
+import image_treatment
+import letter_backends
+import line_tracker
+import motion
+import scanline
+
+
+def synthetic_letters(n, seed=0):
+    """
+    Builds binary 60x90 letter-like inputs shaped like the crops SignReader sends to the network.
+
+    Args:
+        n (int): The number of letters to build.
+        seed (int): The random seed, so runs are comparable.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (n, 90, 60, 1) with values 0 or 255.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.zeros((n, 90, 60, 1), dtype=np.uint8)
+    for i in range(n):
+        # a few random strokes per letter
+        for _ in range(rng.integers(2, 5)):
+            y0, y1 = np.sort(rng.integers(5, 85, size=2))
+            x0, x1 = np.sort(rng.integers(5, 55, size=2))
+            if rng.random() < 0.5:
+                letters[i, y0:y1, x0:x0 + 8] = 255
+            else:
+                letters[i, y0:y0 + 8, x0:x1] = 255
+    return letters
+
+
+def synthetic_sign(seed=0, noise=0.02):
+    """
+    Draws a clue-sign-like image: blue text on a grey-white board with blue specks for noise.
+
+    Args:
+        seed (int): The random seed, so runs are comparable.
+        noise (float): Fraction of pixels turned into blue specks, which become extra contours.
+
+    Returns:
+        numpy.ndarray: BGR image of the sign.
+    """
+    rng = np.random.default_rng(seed)
+    sign = np.full((400, 600, 3), 200, dtype=np.uint8)
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    for y, length in ((150, 6), (330, 10)):
+        text = ''.join(rng.choice(list(alphabet), size=length))
+        cv2.putText(sign, text, (30, y), cv2.FONT_HERSHEY_SIMPLEX, 2.2, (255, 0, 0), 8)
+    specks = rng.random(sign.shape[:2]) < noise
+    sign[specks] = (255, 0, 0)
+    return sign
+
+
+def synthetic_road(seed=0, width=1280, height=720):
+    """
+    Draws a road frame: grey ground with two white road lines that lean towards the horizon.
+
+    Args:
+        seed (int): The random seed, so runs are comparable.
+        width, height (int): The frame size, the camera is 1280x720.
+
+    Returns:
+        numpy.ndarray: BGR image of the road.
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    frame[:height // 3] = (230, 200, 150) # sky
+    centre = width // 2 + int(rng.integers(-150, 150))
+    for side in (-1, 1):
+        bottom = centre + side * int(rng.integers(400, 600))
+        top = centre + side * 60
+        cv2.line(frame, (bottom, height), (top, height // 3), (255, 255, 255), 12)
+    return frame
+
+
+def synthetic_scene(seed=0, width=1280, height=720):
+    """
+    Draws a camera frame with something for every detector: road lines, a clue sign on a blue
+    board, a magenta and a red line across the road, and green and desert coloured patches.
+
+    Args:
+        seed (int): The random seed, so runs are comparable.
+        width, height (int): The frame size, the camera is 1280x720.
+
+    Returns:
+        numpy.ndarray: BGR image of the scene.
+    """
+    rng = np.random.default_rng(seed)
+    frame = synthetic_road(seed, width, height)
+    y = int(rng.integers(height // 2, height - 60))
+    cv2.line(frame, (0, y), (width, y + int(rng.integers(-20, 20))), (255, 0, 255), 18) # magenta
+    cv2.line(frame, (0, y - 80), (width, y - 80), (0, 0, 255), 14) # red, read as RGB by check_red
+    x = int(rng.integers(0, width // 2))
+    cv2.rectangle(frame, (x, height // 3 - 40), (x + 160, height // 3 + 80), (40, 160, 40), -1) # green
+    cv2.rectangle(frame, (width - 300, height - 200), (width - 40, height - 120), (120, 200, 220), -1) # sand
+
+    sign = cv2.resize(synthetic_sign(seed), (300, 200))
+    x0 = width - 400 - int(rng.integers(0, 200))
+    y0 = height // 3 - 150
+    cv2.rectangle(frame, (x0 - 20, y0 - 20), (x0 + 320, y0 + 220), (255, 0, 0), -1) # board
+    frame[y0:y0 + 200, x0:x0 + 300] = sign
+    return frame
+
+
+def synthetic_motion(n, seed=0, width=1280, height=720):
+    """
+    A sequence of road frames with a pedestrian-sized block walking across and a little sensor 
+    noise, for the motion detectors.
+
+    Args:
+        n (int): The number of frames.
+        seed (int): The random seed, so runs are comparable.
+        width, height (int): The frame size, the camera is 1280x720.
+
+    Returns:
+        list: BGR frames.
+    """
+    rng = np.random.default_rng(seed)
+    background = synthetic_road(seed, width, height)
+    frames = []
+    for i in range(n):
+        frame = background.copy()
+        x = 300 + (i * 12) % 700
+        cv2.rectangle(frame, (x, 330), (x + 40, 430), (40, 60, 160), -1)
+        noise = rng.integers(-4, 5, size=frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def load_images(directory):
+    paths = sorted(glob.glob(os.path.join(directory, '*.png')) + glob.glob(os.path.join(directory, '*.jpg')))
+    return [cv2.imread(path) for path in paths]
+
+
+def time_calls(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def latency_stats(times):
+    return {
+        'median_ms': 1000 * float(np.median(times)),
+        'p95_ms': 1000 * float(np.percentile(times, 95)),
+        'p99_ms': 1000 * float(np.percentile(times, 99)),
+    }
+
+
+def traced_memory(fn, inputs):
+    """
+    Runs fn over the inputs under tracemalloc and returns the mean number of blocks still alive
+    after each call (what it kept, e.g. in caches or models) and the mean peak of bytes 
+    allocated during each call, temporaries included. numpy arrays, including those OpenCV 
+    returns, are traced. tracemalloc can't count allocations made and freed within a call, the
+    peak is what shows them. Separate from the timing runs, tracemalloc slows every allocation 
+    down.
+    """
+    blocks = []
+    peaks = []
+    tracemalloc.start()
+    for x in inputs:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(x)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        after = tracemalloc.take_snapshot()
+        blocks.append(sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'traceback')))
+    tracemalloc.stop()
+    return float(np.mean(blocks)), float(np.mean(peaks))
+
+
+def bench_letter_backends(args):
+    """
+    Checks the backends agree on the same letters, then compares their load time, latency and
+    throughput. Returns a non-zero exit code if the predicted letters disagree too often.
+    """
+    backends = {}
+    for kind, path in (('keras', args.keras_model), ('numpy', args.weights)):
+        start = time.perf_counter()
+        backends[kind] = letter_backends.load_backend(kind, path)
+        print(f'{kind:6s} load: {1000 * (time.perf_counter() - start):9.2f} ms')
+
+    letters = synthetic_letters(args.num_letters)
+    yp_keras = backends['keras'].predict(letters)
+    yp_numpy = backends['numpy'].predict(letters)
+    agreement = np.mean(np.argmax(yp_keras, axis=1) == np.argmax(yp_numpy, axis=1))
+    max_diff = np.max(np.abs(yp_keras - yp_numpy))
+    print(f'parity: {100 * agreement:.2f}% same letter, max probability difference {max_diff:.2e}')
+
+    for batch_size in args.batch_sizes:
+        batch = letters[:batch_size]
+        for kind, backend in backends.items():
+            backend.predict(batch) # warm up
+            times = time_calls(lambda: backend.predict(batch), args.repeats)
+            median = np.median(times)
+            print(f'{kind:6s} batch {batch_size:4d}: {1000 * median:9.2f} ms median, '
+                  f'{batch.shape[0] / median:10.1f} letters/sec')
+
+    return 0 if agreement >= args.min_agreement else 1
+
+
+# the per point python loop cropToWord used before it was vectorized, kept as the reference
+def crop_to_word_loop(img):
+    Hstart, Wstart = img.shape[:2]
+    buff = int(0.01*Wstart)
+    words = [img[buff:int(Hstart/2), buff:Wstart-buff], img[int(Hstart/2):Hstart-buff, buff:Wstart-buff]]
+    croppedWords = []
+    for word in words:
+        h_, w_ = word.shape[:2]
+        hsv_img = cv2.cvtColor(word, cv2.COLOR_BGR2HSV)
+        h, s, v = cv2.split(hsv_img)
+        v[v > 0] = 255
+        v[v <= 0] += 255
+        mask = cv2.inRange(cv2.merge((h, s, v)), (5,20,0), (150,255,255))
+        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        startX = w_; startY = h_; endX = 0; endY = 0
+        for cnt in contours:
+            for p in cv2.boxPoints(cv2.minAreaRect(cnt)):
+                if p[0] <= startX:
+                    startX = p[0]
+                if p[0] >= endX:
+                    endX = p[0]
+                if p[1] <= startY:
+                    startY = p[1]
+                if p[1] >= endY:
+                    endY = p[1]
+        cropped = word[int(round(startY)):int(round(endY)), int(round(startX)):int(round(endX))]
+        h, w = cropped.shape[:2]
+        cropped = cv2.resize(cropped, (int(90*w/h), 90), interpolation= cv2.INTER_LINEAR)
+        croppedWords.append(cropped)
+    return croppedWords
+
+
+# the per pixel python loop the road centre search used before scanline, kept as the reference
+def row_edges_loop(img, y, width, height):
+    left_index = right_index = -1
+    for i in range(width):
+        if img[height - y, i] == 255 and left_index == -1:
+            left_index = i
+        elif img[height - y, i] == 255 and left_index != -1:
+            right_index = i
+    return left_index, right_index
+
+
+def bench_scanline(args):
+    """
+    Compares the road line search of the 'road' state before and after scanline: full frame
+    gray + threshold + python loop against one sliced row + threshold + vectorized edges.
+    Returns a non-zero exit code if the edges differ.
+    """
+    frames = load_images(args.frames) if args.frames else [synthetic_road(seed) for seed in range(args.num_frames)]
+    y = args.road_buffer
+
+    def loop(frame):
+        height, width = frame.shape[:2]
+        mask = cv2.inRange(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 250, 255)
+        return row_edges_loop(mask, y, width, height)
+
+    def vectorized(frame):
+        row = frame.shape[0] - y
+        mask = cv2.inRange(cv2.cvtColor(frame[row:row + 1], cv2.COLOR_BGR2GRAY), 250, 255)
+        return scanline.row_edges(mask[0])
+
+    for frame in frames:
+        if loop(frame) != vectorized(frame):
+            print('scanline edges differ from the reference loop')
+            return 1
+
+    loop_times = time_calls(lambda: [loop(frame) for frame in frames], args.repeats) / len(frames)
+    new_times = time_calls(lambda: [vectorized(frame) for frame in frames], args.repeats) / len(frames)
+    print(f'{len(frames)} frames, identical edges')
+    print(f'loop:     {1000 * np.median(loop_times):8.3f} ms/frame')
+    print(f'scanline: {1000 * np.median(new_times):8.3f} ms/frame')
+    print(f'speedup:  {np.median(loop_times) / np.median(new_times):8.2f}x')
+    return 0
+
+
+def bench_crop_to_word(args):
+    """
+    Checks cropToWord gives the same crops as the reference loop, then reports the time per sign
+    of both. Returns a non-zero exit code if any crop differs.
+    """
+    if args.signs:
+        signs = load_images(args.signs)
+    else:
+        signs = [synthetic_sign(seed, args.noise) for seed in range(args.num_signs)]
+
+    for sign in signs:
+        for new, ref in zip(image_treatment.cropToWord(sign), crop_to_word_loop(sign)):
+            if new.shape != ref.shape or not np.array_equal(new, ref):
+                print('cropToWord differs from the reference loop')
+                return 1
+
+    loop_times = time_calls(lambda: [crop_to_word_loop(sign) for sign in signs], args.repeats) / len(signs)
+    new_times = time_calls(lambda: [image_treatment.cropToWord(sign) for sign in signs], args.repeats) / len(signs)
+    print(f'{len(signs)} signs, identical crops')
+    print(f'loop:       {1000 * np.median(loop_times):8.3f} ms/sign')
+    print(f'vectorized: {1000 * np.median(new_times):8.3f} ms/sign')
+    print(f'speedup:    {np.median(loop_times) / np.median(new_times):8.2f}x')
+    return 0
+
+
+def bench_motion(args):
+    """
+    Times the motion detector modes per call, over the whole frame and over the pedestrian crop,
+    against the shared full resolution colour MOG2 the detectors used before.
+    """
+    frames = load_images(args.frames) if args.frames else synthetic_motion(args.num_frames)
+    regions = {'full': None, 'ped crop': (400, 320, 920, 440)}
+
+    def colour_mog2(roi):
+        model = cv2.createBackgroundSubtractorMOG2()
+        x0, y0, x1, y1 = roi or (0, 0, frames[0].shape[1], frames[0].shape[0])
+        return lambda frame: model.apply(frame.img[y0:y1, x0:x1])
+
+    print(f'{len(frames)} frames')
+    for region, roi in regions.items():
+        runs = [('colour mog2 1x (old)', colour_mog2(roi))]
+        for mode in motion.MODES:
+            for scale in args.scales:
+                detector = motion.MotionDetector(mode, scale, roi)
+                runs.append((f'{mode} {scale:g}x', detector.apply))
+        for name, apply in runs:
+            contexts = [frame_context.FrameContext(frame) for frame in frames]
+            times = time_calls(lambda: apply(contexts.pop(0)), len(contexts))
+            stats = latency_stats(times)
+            print(f'{region:8s} {name:22s} {stats["median_ms"]:8.3f} ms median, {stats["p95_ms"]:8.3f} ms p95')
+    return 0
+
+
+def bench_colour_lut(args):
+    """
+    Compares extracting every colour class mask with cvtColor + inRange per colour space against
+    one lookup table pass and a bit test per class, per frame. Reports how many pixels of each 
+    class the quantized table gets wrong. Returns a non-zero exit code if any class disagrees 
+    on more than --max-mismatch of its pixels, by default on any difference at all.
+    """
+    frames = load_images(args.frames) if args.frames else [synthetic_scene(seed) for seed in range(args.num_frames)]
+    names = list(colour_lut.COLOUR_CLASSES)
+    failed = False
+    for bits in args.bits:
+        classifier = colour_lut.ColourClassifier(bits)
+        print(f'{bits} bit table: {classifier.table.nbytes / 2**20:.2f} MB, built in {1000 * classifier.build_time:.1f} ms')
+
+        mismatched = {name: 0 for name in names}
+        members = {name: 0 for name in names}
+        for frame in frames:
+            reference = frame_context.FrameContext(frame)
+            labels = classifier.classify(frame)
+            for name in names:
+                ref = reference.mask(name)
+                mismatched[name] += np.count_nonzero(ref != classifier.mask(labels, name))
+                members[name] += np.count_nonzero(ref)
+        for name in names:
+            ratio = mismatched[name] / max(members[name], 1)
+            failed |= ratio > args.max_mismatch
+            print(f'  {name:20s} {mismatched[name]:9d} pixels differ ({100 * ratio:6.2f}% of {members[name]})')
+
+        def inrange(frame):
+            context = frame_context.FrameContext(frame)
+            return [colour_lut.class_mask(lambda space: getattr(context, space), colour_lut.COLOUR_CLASSES[name])
+                    for name in names]
+
+        def lut(frame):
+            labels = classifier.classify(frame)
+            return [classifier.mask(labels, name) for name in names]
+
+        old = latency_stats(np.concatenate([time_calls(lambda: inrange(frame), args.repeats) for frame in frames]))
+        new = latency_stats(np.concatenate([time_calls(lambda: lut(frame), args.repeats) for frame in frames]))
+        print(f'  cvtColor + inRange: {old["median_ms"]:8.3f} ms/frame median, {old["p95_ms"]:8.3f} p95')
+        print(f'  lookup table:       {new["median_ms"]:8.3f} ms/frame median, {new["p95_ms"]:8.3f} p95')
+    return 1 if failed else 0
+
+
+def bench_blobs(args):
+    """
+    Checks Blobs gives the areas, boxes and perimeters of per contour OpenCV calls on every colour
+    class mask, then compares the cost of the largest-blob query detectors make. Returns a 
+    non-zero exit code on any mismatch.
+    """
+    frames = load_images(args.frames) if args.frames else [synthetic_scene(seed) for seed in range(args.num_frames)]
+    masks = []
+    for frame in frames:
+        context = frame_context.FrameContext(frame)
+        masks += [context.mask(name) for name in colour_lut.COLOUR_CLASSES]
+
+    for mask in masks:
+        found = blobs.Blobs(mask, cv2.RETR_TREE)
+        areas = [cv2.contourArea(c) for c in found.contours]
+        boxes = [cv2.boundingRect(c) for c in found.contours]
+        perimeters = [cv2.arcLength(c, True) for c in found.contours]
+        if (not np.allclose(found.areas, areas) or not np.array_equal(found.boxes.reshape(-1, 4), np.array(boxes).reshape(-1, 4))
+                or not np.allclose(found.perimeters, perimeters, rtol=1e-5)):
+            print('blob statistics differ from OpenCV')
+            return 1
+
+    def per_contour(mask):
+        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        if len(contours) == 0:
+            return None
+        largest_contour = max(contours, key=cv2.contourArea)
+        return cv2.contourArea(largest_contour), cv2.boundingRect(largest_contour)
+
+    def blob_arrays(mask):
+        found = blobs.Blobs(mask)
+        if len(found) == 0:
+            return None
+        largest = found.largest()
+        return found.areas[largest], found.box(largest)
+
+    old = latency_stats(np.concatenate([time_calls(lambda: per_contour(mask), args.repeats) for mask in masks]))
+    new = latency_stats(np.concatenate([time_calls(lambda: blob_arrays(mask), args.repeats) for mask in masks]))
+    print(f'{len(masks)} masks, identical statistics')
+    print(f'findContours tree + max(contourArea): {old["median_ms"]:8.3f} ms median, {old["p95_ms"]:8.3f} p95')
+    print(f'Blobs external + largest:             {new["median_ms"]:8.3f} ms median, {new["p95_ms"]:8.3f} p95')
+    return 0
+
+
+def synthetic_line_approach(n, colour, width=1280, height=720):
+    """
+    Frames of the robot driving up to a line: the line slides down the frame a few pixels a
+    frame and slowly straightens out.
+    """
+    frames = []
+    for i in range(n):
+        frame = synthetic_road(0, width, height)
+        y = height // 2 + (4 * i) % (height // 2 - 20)
+        tilt = max(0, 40 - i)
+        cv2.line(frame, (0, y - tilt), (width, y + tilt), colour, 16)
+        frames.append(frame)
+    return frames
+
+
+def synthetic_line_distractor(n, colour, width=1280, height=720):
+    """
+    Frames where the tracker can latch onto the wrong blob: a speck of the line colour alone,
+    then a line appears away from it, then a thicker line appears further down.
+    """
+    frames = []
+    for i in range(n):
+        frame = synthetic_road(0, width, height)
+        cv2.rectangle(frame, (200, 260), (214, 274), colour, -1) # too small to count as a line
+        if i >= n // 3:
+            cv2.line(frame, (0, height // 2), (width, height // 2), colour, 8)
+        if i >= 2 * n // 3:
+            cv2.line(frame, (0, height - 80), (width, height - 80), colour, 30)
+        frames.append(frame)
+    return frames
+
+
+def bench_line_tracker(args):
+    """
+    Follows the red and magenta lines across sequences with the tracker and with a full frame
+    search per frame, and compares their cost. The tracker must agree with the full search on
+    whether a line of at least --min-area is in view on every frame, and may only follow a
+    smaller line than the largest one for fewer than --refresh-period frames in a row. Returns
+    a non-zero exit code otherwise.
+    """
+    for name, bgr in (('red_line', (0, 0, 255)), ('magenta', (255, 0, 255))):
+        if args.frames:
+            sequences = {'recorded': load_images(args.frames)}
+        else:
+            sequences = {'approach': synthetic_line_approach(args.num_frames, bgr),
+                         'distractor': synthetic_line_distractor(args.num_frames, bgr)}
+        for sequence, frames in sequences.items():
+            tracker = line_tracker.LineTracker(name, args.min_area, args.pad, args.refresh_period)
+
+            def full(frame):
+                return line_tracker.largest_line(frame_context.FrameContext(frame).mask(name))
+
+            def tracked(frame):
+                return tracker.update(frame_context.FrameContext(frame))
+
+            def detected(line):
+                return line is not None and line.area >= args.min_area
+
+            stale = 0 # frames in a row the tracker followed a different line
+            for i, frame in enumerate(frames):
+                a, b = full(frame), tracked(frame)
+                if detected(a) != detected(b):
+                    print(f'{name} {sequence}: frame {i} line detection differs from the full frame search')
+                    return 1
+                same = (a is None) == (b is None) and (a is None or (a.rect == b.rect and a.area == b.area))
+                stale = 0 if same else stale + 1
+                if stale >= args.refresh_period:
+                    print(f'{name} {sequence}: tracked a different line than the full frame search for {stale} frames')
+                    return 1
+
+            tracker.reset()
+            full_times = np.concatenate([time_calls(lambda: full(frame), 1) for frame in frames for _ in range(args.repeats)])
+            tracked_times = np.concatenate([time_calls(lambda: tracked(frame), 1) for frame in frames for _ in range(args.repeats)])
+            old, new = latency_stats(full_times), latency_stats(tracked_times)
+            print(f'{name} {sequence}: {len(frames)} frames, same detections, {tracker.stats()}')
+            print(f'  full frame: {old["median_ms"]:8.3f} ms median, {old["p95_ms"]:8.3f} p95')
+            print(f'  tracked:    {new["median_ms"]:8.3f} ms median, {new["p95_ms"]:8.3f} p95')
+    return 0
+
+
+def bench_sign_search(args):
+    """
+    Runs check_if_sign over every frame in every search region state, with the whole region
+    searched at full resolution and with the coarse-to-fine pass, and compares the cost. Returns
+    a non-zero exit code if any frame gives a different sign crop, or a sign in only one of them.
+    """
+    frames = load_images(args.frames) if args.frames else [synthetic_scene(seed) for seed in range(args.num_frames)]
+    _, reader = headless_detectors(args.weights)
+
+    def search(frame, state, coarse_to_fine):
+        reader.sign_coarse_to_fine = coarse_to_fine
+        return reader.check_if_sign(frame_context.FrameContext(frame), state)
+
+    mismatches = 0
+    signs = 0
+    for state in reader.sign_search_regions:
+        for i, frame in enumerate(frames):
+            full, coarse = search(frame, state, False), search(frame, state, True)
+            signs += full is not None
+            if (full is None) != (coarse is None) or (full is not None and not np.array_equal(full, coarse)):
+                mismatches += 1
+                print(f'{state}: frame {i} sign differs, full search '
+                      f'{"none" if full is None else full.shape}, coarse {"none" if coarse is None else coarse.shape}')
+
+    old = latency_stats(np.concatenate([time_calls(lambda: search(frame, 'road', False), args.repeats) for frame in frames]))
+    new = latency_stats(np.concatenate([time_calls(lambda: search(frame, 'road', True), args.repeats) for frame in frames]))
+    print(f'{len(frames)} frames in {len(reader.sign_search_regions)} states, {signs} signs, {mismatches} mismatches')
+    print(f'  full resolution: {old["median_ms"]:8.3f} ms median, {old["p95_ms"]:8.3f} p95')
+    print(f'  coarse-to-fine:  {new["median_ms"]:8.3f} ms median, {new["p95_ms"]:8.3f} p95')
+    return 1 if mismatches else 0
+
+
+def headless_detectors(weights):
+    """
+    Builds a Driver and SignReader on the fake rospy so the detectors can run without ROS. The 
+    letter model is not needed, so it is pointed at the numpy weights, which load fast or fail.
+    """
+    import fake_rospy
+    fake_rospy.install()
+    fake_rospy.params.update({'~letter_backend': 'numpy', '~weights_path': weights})
+    import controller
+    import sign_reader
+    driver = controller.Driver()
+    reader = sign_reader.SignReader(driver.mailbox)
+    controller.my_bot = reader
+    return driver, reader
+
+
+def detector_cases(driver, reader):
+    """
+    Returns (name, state, function of a frame) for every detector, with the state the driver is
+    in when it normally runs, since several detectors branch on it.
+    """
+    return [
+        ('get_error', 'road', lambda img: driver.get_error(img)),
+        ('check_if_sign', 'road', lambda img: reader.check_if_sign(img, 'road')),
+        ('check_red', 'road', lambda img: driver.check_red(img)),
+        ('check_red_angle', 'ped', lambda img: driver.check_red(img, ret_angle=True)),
+        ('check_pedestrian', 'ped', lambda img: driver.check_pedestrian(img)),
+        ('check_truck', 'truck', lambda img: driver.check_truck(img, at_intersection=True)),
+        ('check_magenta', 'desert', lambda img: driver.check_magenta(img)),
+        ('check_magenta_y', 'yoda', lambda img: driver.check_magenta(img, ret_y=True)),
+        ('thresh_desert', 'desert', lambda img: driver.thresh_desert(img)),
+        ('thresh_desert_mountain', 'mountain', lambda img: driver.thresh_desert(img)),
+        ('check_yoda', 'yoda', lambda img: driver.check_yoda(img)),
+        ('check_cactus', 'yoda', lambda img: driver.check_cactus(img)),
+        ('check_hill_stop', 'yoda', lambda img: driver.check_hill_stop(img)),
+        ('find_tunnel', 'tunnel', lambda img: driver.find_tunnel(img)),
+        ('find_mountain_sign', 'mountain top', lambda img: driver.find_mountain_sign(img)),
+        ('cropToBlue', None, image_treatment.cropToBlue),
+    ]
+
+
+def sign_cases():
+    return [
+        ('cropToWord', image_treatment.cropToWord),
+        ('wordToLetters', lambda sign: image_treatment.wordToLetters(image_treatment.cropToWord(sign)[1])),
+        ('signToLetters', image_treatment.signToLetters),
+    ]
+
+
+def run_case(fn, inputs, repeats):
+    for x in inputs:
+        fn(x) # warm up, and let stateful detectors like the background subtractor settle
+    times = np.concatenate([time_calls(lambda: fn(x), repeats) for x in inputs])
+    result = latency_stats(times)
+    result['calls'] = len(times)
+    result['retained_blocks'], result['peak_bytes'] = traced_memory(fn, inputs)
+    return result
+
+
+def compare_results(results, baseline, max_regression):
+    """
+    Compares median latencies against a saved run. Returns the names of the cases that got 
+    slower than max_regression allows.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median_ms'] / max(baseline[name]['median_ms'], 1e-6)
+        flag = ''
+        if ratio > 1 + max_regression:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:24s} {baseline[name]["median_ms"]:9.3f} -> {result["median_ms"]:9.3f} ms ({ratio:5.2f}x){flag}')
+    return regressions
+
+
+def bench_detectors(args):
+    """
+    Times every detector and the image_treatment sign functions per call over a fixed frame set,
+    reporting median, p95 and p99 latency and the memory each call keeps and peaks at. Results can be saved as json
+    and compared against an earlier run. Returns a non-zero exit code if a case raised, or on a
+    regression against the baseline.
+    """
+    frames = load_images(args.frames) if args.frames else [synthetic_scene(seed) for seed in range(args.num_frames)]
+    signs = load_images(args.signs) if args.signs else [synthetic_sign(seed) for seed in range(args.num_frames)]
+    driver, reader = headless_detectors(args.weights)
+    driver.img_height, driver.img_width = frames[0].shape[:2]
+
+    results = {}
+    failures = {} # name -> the exception of cases that raised
+    print(f'{len(frames)} frames, {len(signs)} signs, {args.repeats} repeats')
+    print(f'{"":24s} {"median":>9s} {"p95":>9s} {"p99":>9s} ms {"kept":>8s} {"peak kB":>9s}')
+    cases = [(name, state, fn, frames) for name, state, fn in detector_cases(driver, reader)]
+    cases += [(name, None, fn, signs) for name, fn in sign_cases()]
+    for name, state, fn, inputs in cases:
+        if args.only and name not in args.only:
+            continue
+        if state is not None:
+            driver.state = state
+        try:
+            result = run_case(fn, inputs, args.repeats)
+        except Exception as e: # the other cases still run, the failure is reported at the end
+            failures[name] = repr(e)
+            print(f'{name:24s} failed: {e!r}')
+            continue
+        results[name] = result
+        print(f'{name:24s} {result["median_ms"]:9.3f} {result["p95_ms"]:9.3f} {result["p99_ms"]:9.3f}    '
+              f'{result["retained_blocks"]:8.1f} {result["peak_bytes"] / 1024:9.1f}')
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'frames': len(frames), 'signs': len(signs), 'repeats': args.repeats,
+                       'results': results, 'failures': failures}, f, indent=2)
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_results(results, baseline, args.max_regression)
+        if regressions:
+            print(f'{len(regressions)} regressions over {100 * args.max_regression:.0f}%: ' + ', '.join(regressions))
+            status = 1
+    if failures:
+        print(f'{len(failures)} cases failed: ' + ', '.join(failures))
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='performance benchmarks for the competition code')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    letters_parser = subparsers.add_parser('letters', help='compare the letter classifier backends')
+    letters_parser.add_argument('--keras-model', default='/home/fizzer/broda_data/my_model05')
+    letters_parser.add_argument('--weights', default='/home/fizzer/broda_data/my_model05.npz')
+    letters_parser.add_argument('--num-letters', type=int, default=256)
+    letters_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 5, 60, 256])
+    letters_parser.add_argument('--repeats', type=int, default=20)
+    letters_parser.add_argument('--min-agreement', type=float, default=0.99)
+    letters_parser.set_defaults(func=bench_letter_backends)
+
+    crop_parser = subparsers.add_parser('crop', help='compare cropToWord against the python loop')
+    crop_parser.add_argument('--signs', help='directory of sign crops, synthetic signs if not given')
+    crop_parser.add_argument('--num-signs', type=int, default=8)
+    crop_parser.add_argument('--noise', type=float, default=0.02)
+    crop_parser.add_argument('--repeats', type=int, default=20)
+    crop_parser.set_defaults(func=bench_crop_to_word)
+
+    scanline_parser = subparsers.add_parser('scanline', help='compare the road line search against the python loop')
+    scanline_parser.add_argument('--frames', help='directory of camera frames, synthetic roads if not given')
+    scanline_parser.add_argument('--num-frames', type=int, default=20)
+    scanline_parser.add_argument('--road-buffer', type=int, default=200)
+    scanline_parser.add_argument('--repeats', type=int, default=20)
+    scanline_parser.set_defaults(func=bench_scanline)
+
+    detectors_parser = subparsers.add_parser('detectors', help='per call latency and memory of every detector')
+    detectors_parser.add_argument('--frames', help='directory of camera frames, synthetic scenes if not given')
+    detectors_parser.add_argument('--signs', help='directory of sign crops, synthetic signs if not given')
+    detectors_parser.add_argument('--num-frames', type=int, default=10)
+    detectors_parser.add_argument('--repeats', type=int, default=20)
+    detectors_parser.add_argument('--only', nargs='+', help='names of the cases to run')
+    detectors_parser.add_argument('--weights', default='/home/fizzer/broda_data/my_model05.npz')
+    detectors_parser.add_argument('--out', help='save the results to this json file')
+    detectors_parser.add_argument('--baseline', help='json results of an earlier run to compare against')
+    detectors_parser.add_argument('--max-regression', type=float, default=0.2,
+                                  help='allowed median slowdown against the baseline, as a fraction')
+    detectors_parser.set_defaults(func=bench_detectors)
+
+    signs_parser = subparsers.add_parser('signs', help='check the coarse-to-fine sign search against the full search')
+    signs_parser.add_argument('--frames', help='directory of camera frames, synthetic scenes if not given')
+    signs_parser.add_argument('--num-frames', type=int, default=10)
+    signs_parser.add_argument('--repeats', type=int, default=10)
+    signs_parser.add_argument('--weights', default='/home/fizzer/broda_data/my_model05.npz')
+    signs_parser.set_defaults(func=bench_sign_search)
+
+    motion_parser = subparsers.add_parser('motion', help='cost per call of the motion detector modes')
+    motion_parser.add_argument('--frames', help='directory of consecutive camera frames, synthetic if not given')
+    motion_parser.add_argument('--num-frames', type=int, default=100)
+    motion_parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5, 0.25])
+    motion_parser.set_defaults(func=bench_motion)
+
+    colour_parser = subparsers.add_parser('colour', help='compare the colour lookup table against cvtColor + inRange')
+    colour_parser.add_argument('--frames', help='directory of camera frames, synthetic scenes if not given')
+    colour_parser.add_argument('--num-frames', type=int, default=5)
+    colour_parser.add_argument('--bits', type=int, nargs='+', default=[8],
+                               help='table sizes to check, below 8 bits pass --max-mismatch to allow the rounding')
+    colour_parser.add_argument('--repeats', type=int, default=10)
+    colour_parser.add_argument('--max-mismatch', type=float, default=0.0,
+                               help='fraction of the pixels of a class allowed to differ, 1 to only report')
+    colour_parser.set_defaults(func=bench_colour_lut)
+
+    blobs_parser = subparsers.add_parser('blobs', help='check and time the blob statistics against per contour calls')
+    blobs_parser.add_argument('--frames', help='directory of camera frames, synthetic scenes if not given')
+    blobs_parser.add_argument('--num-frames', type=int, default=5)
+    blobs_parser.add_argument('--repeats', type=int, default=10)
+    blobs_parser.set_defaults(func=bench_blobs)
+
+    lines_parser = subparsers.add_parser('lines', help='compare the line tracker against full frame searches')
+    lines_parser.add_argument('--frames', help='directory of consecutive camera frames, synthetic if not given')
+    lines_parser.add_argument('--num-frames', type=int, default=60)
+    lines_parser.add_argument('--pad', type=int, default=40)
+    lines_parser.add_argument('--min-area', type=float, default=1000,
+                              help='smallest blob counted as a line, red_line_min_area in the driver')
+    lines_parser.add_argument('--refresh-period', type=int, default=10)
+    lines_parser.add_argument('--repeats', type=int, default=5)
+    lines_parser.set_defaults(func=bench_line_tracker)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+
+import time
+
+import cv2
+import numpy as np
+
+
+# every colour class the detectors threshold for, as a union of cv2.inRange ranges on one of the
+# colour spaces of a FrameContext: 'hsv', 'hsv_rgb' (hsv of the frame read as RGB) or 'gray'
+COLOUR_CLASSES = {
+    'road_white': [('gray', 250, 255)],
+    'red_line': [('hsv_rgb', (90, 50, 230), (255, 255, 255))],
+    'magenta': [('hsv', (150, 90, 110), (175, 255, 255))],
+    'desert': [('hsv', (13, 35, 179), (37, 98, 255))],
+    'desert_mountain': [('hsv', (13, 35, 173), (37, 98, 255))], # a little darker, for the mountain
+    'mountain_road': [('hsv', (0, 27, 110), (37, 255, 255))],
+    'tunnel': [('hsv', (0, 106, 66), (9, 255, 255))],
+    'yoda': [('hsv', (57, 96, 89), (68, 255, 255))],
+    'cactus': [('hsv', (56, 86, 63), (66, 255, 255))],
+    'sign_blue': [('hsv', (5, 20, 0), (150, 255, 255))],
+    'sign_white': [('gray', 95, 105), ('gray', 195, 205), ('gray', 115, 125)],
+    'mountain_sign_white': [('gray', 95, 105)],
+}
+
+CONVERSIONS = {
+    'hsv': cv2.COLOR_BGR2HSV,
+    'hsv_rgb': cv2.COLOR_RGB2HSV,
+    'gray': cv2.COLOR_BGR2GRAY,
+}
+
+
+def class_mask(colour, ranges):
+    """
+    Thresholds one colour class the way the detectors always did, with cv2.inRange.
+
+    Args:
+        colour (callable): Returns the image in the named colour space.
+        ranges (list): The (colour space, lower, upper) ranges of the class.
+
+    Returns:
+        numpy.ndarray: uint8 mask, 255 where any of the ranges matched.
+    """
+    mask = None
+    for space, lower, upper in ranges:
+        part = cv2.inRange(colour(space), lower, upper)
+        mask = part if mask is None else cv2.bitwise_or(mask, part)
+    return mask
+
+
+class ColourClassifier():
+    """
+    Labels every pixel with a bitmask of the colour classes it belongs to, through one table
+    lookup per pixel and no colour conversion.
+
+    The table is built once: each channel is quantized to bits bits, and every quantized colour
+    is converted and thresholded with the same ranges the detectors use. With bits=8 the labels
+    match cv2.inRange exactly, and the table takes 32 MB. With fewer bits it is smaller and
+    pixels near a range edge can land on the wrong side (see the 'colour' benchmark).
+    """
+    def __init__(self, bits=8, classes=COLOUR_CLASSES):
+        if len(classes) > 16:
+            raise ValueError('at most 16 colour classes fit in the uint16 labels')
+        self.bits = bits
+        self.classes = classes
+        self.class_bits = {name: 1 << i for i, name in enumerate(classes)}
+
+        start_time = time.perf_counter()
+        shift = 8 - bits
+        n = 1 << bits
+        # quantized channel value -> its part of the table index, table index is b, g, r major to minor
+        levels = np.arange(256) >> shift
+        self.b_index = (levels * n * n).astype(np.int32)
+        self.g_index = (levels * n).astype(np.int32)
+        self.r_index = levels.astype(np.int32)
+
+        # every quantized colour at the centre of its cell, as an n*n x n image
+        centres = ((np.arange(n) << shift) + ((1 << shift) >> 1)).astype(np.uint8)
+        b, g, r = np.meshgrid(centres, centres, centres, indexing='ij')
+        palette = np.stack((b, g, r), axis=-1).reshape(n * n, n, 3)
+        colours = {space: cv2.cvtColor(palette, code) for space, code in CONVERSIONS.items()}
+
+        self.table = np.zeros(n * n * n, dtype=np.uint16)
+        for name, ranges in classes.items():
+            self.table[class_mask(colours.get, ranges).reshape(-1) != 0] |= self.class_bits[name]
+        self.build_time = time.perf_counter() - start_time
+
+    def classify(self, img):
+        """
+        Labels a BGR image.
+
+        Args:
+            img (numpy.ndarray): The BGR image.
+
+        Returns:
+            numpy.ndarray: uint16 image of class bitmasks, the same height and width as img.
+        """
+        index = self.b_index[img[:, :, 0]]
+        index += self.g_index[img[:, :, 1]]
+        index += self.r_index[img[:, :, 2]]
+        return self.table[index]
+
+    def mask(self, labels, name):
+        """
+        Extracts one class from a label image.
+
+        Args:
+            labels (numpy.ndarray): The labels from classify.
+            name (str): The colour class.
+
+        Returns:
+            numpy.ndarray: uint8 mask, 255 where the pixel is in the class, like cv2.inRange.
+        """
+        return cv2.compare(np.bitwise_and(labels, self.class_bits[name]), 0, cv2.CMP_NE)
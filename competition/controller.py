@@ -1,55 +1,95 @@
 #! /usr/bin/env python3
 
+import time
+process_start_time = time.perf_counter()
+
 import rospy
 import cv2
 import numpy as np
-from cv_bridge import CvBridge
 from sensor_msgs.msg import Image
 from geometry_msgs.msg import Twist
 from std_msgs.msg import String
 
+import blobs
+import colour_lut
+import frame_context
+import frame_decoder
+import frame_mailbox
+import instrumentation
+import latency
+import line_tracker
+import motion
+import scanline
+import velocity_publisher
+import visualization
+
+import_start_time = time.perf_counter()
 import sign_reader
+sign_reader_import_time = time.perf_counter() - import_start_time
+
+# methods timed per call when timing is turned on
+DETECTORS = ('get_error', 'check_red', 'check_pedestrian', 'check_truck', 'check_magenta', 'thresh_desert',
+             'check_yoda', 'check_cactus', 'check_hill_stop', 'find_tunnel', 'find_mountain_sign')
+SIGN_DETECTORS = ('check_if_sign', 'compare_sign', 'finish_sign')
 
 class Driver():
     def __init__(self):
         rospy.init_node('robot_pid_er')
 
-        self.bridge = CvBridge()
-        rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback)
+        self.decoder = frame_decoder.FrameDecoder()
         self.vel_pub = rospy.Publisher('/R1/cmd_vel', Twist, queue_size=1)
         self.score_pub = rospy.Publisher('/score_tracker', String, queue_size=1)
 
         self.state = 'init' # init, road, ped, truck, desert, yoda, tunnel, mountain
         
         # image variables
-        self.img = None
+        self.mailbox = frame_mailbox.FrameMailbox() # latest camera frame, shared with the sign reader
+        self.frame = None # FrameContext the control loop is working on, shared by every detector
+        self.processed_seq = 0 # sequence number of the last frame the control loop picked up
+        self.frame_wait_timeout = 0.5 # seconds between shutdown checks while waiting for a frame
         self.img_height = 0
         self.img_width = 0
         
         self.cycle_count = 0
 
         # PID controller variables
-        self.move = Twist()
         self.lin_speed = 0.5 # defualt PID linear speed of robot
         self.sign_lin_speed = 0.25 # slower PID linear speed for sign reading
         self.rot_speed = 1.0 # base PID angular speed of robot
         self.sign_rot_speed = 1.1 # slower PID angular speed for sign reading
 
-        self.road_line_width = 150
-        self.road_min_white_val = 250
-        self.road_max_white_val = 255
+        self.road_line_width = 150 # the road line white is the 'road_white' class in colour_lut
         
         self.kp = 11 # proportional gain for PID controller
         self.kd = 0.5
         self.prev_error = 0
-        self.last_time = 0
+        self.last_time = None # header stamp of the previous camera frame
         self.dt = 0
         self.road_buffer = 200 # pixels above bottom of image to find road centre
+
+        # 'row' reads the road centre from the single road_buffer row, 'fit' fits a line through
+        # the centres of several rows around it (only in the fit_error_states)
+        self.error_mode = 'row'
+        self.fit_error_states = ('road', 'desert', 'mountain')
+        self.fit_num_rows = 9
+        self.fit_row_spacing = 8 # pixels between sampled rows
+        self.fit_degree = 1
+        self.fit_max_outlier = 80 # rows whose centre is further than this from the median are ignored
         self.speed_buffer = 1.3 # buffer for gradual speed increase/decrease
 
         self.accel_rate = 0.1 # velocity to increase by with each loop
         self.decel_rate = 0.1 # velocity to decrease by with each loop
         self.accel_freq = 50 # frequency of loop when increasing/decreasing speed
+        self.cmd_rate = 50 # frequency velocity commands are published at
+
+        self.first_cmd_time = None # seconds from process start to the first cmd_vel publish
+        self.latency = latency.LatencyTracker(window_size=300, stale_age=0.25)
+        self.latency_report_period = 10.0 # seconds of ROS time between latency prints
+        self.last_latency_report = None
+        # the replay harness turns the thread off and ticks the publisher on its simulated clock
+        self.velocity = velocity_publisher.VelocityPublisher(self.publish_move, self.cmd_rate, self.accel_rate,
+                                                             self.decel_rate, self.accel_freq, self.speed_buffer,
+                                                             threaded=rospy.get_param('~velocity_thread', True))
         
         # Pedestraian detection variables
         self.reached_crosswalk = False
@@ -59,12 +99,25 @@ class Driver():
         self.red_line_min_angle = 1.0
         self.red_line_max_angle = 89.0
         self.red_line_stop_y = 400
+
+        # the red and magenta lines are searched for near where they were in the last frame, as
+        # long as the tracked blob is big enough to be a line (desert_past_magenta_line_area for magenta)
+        self.track_lines = True
+        self.red_tracker = line_tracker.LineTracker('red_line', self.red_line_min_area)
+        self.magenta_tracker = line_tracker.LineTracker('magenta', 1000)
        
-        self.bg_sub = cv2.createBackgroundSubtractorMOG2()
         self.ped_crop_x_min = 400 # values for cropping image to crosswalk and pedestrian
         self.ped_crop_x_max = 920
         self.ped_crop_y_min = 320
         self.ped_crop_y_max = 440
+
+        # each motion detector keeps its own background model on a shrunk gray region
+        self.motion_mode = 'mog2' # 'mog2', 'diff' or 'running_avg', see motion.py
+        self.motion_scale = 0.5
+        ped_roi = (self.ped_crop_x_min, self.ped_crop_y_min, self.ped_crop_x_max, self.ped_crop_y_max)
+        self.ped_motion = motion.MotionDetector(self.motion_mode, self.motion_scale, ped_roi)
+        self.truck_motion = motion.MotionDetector(self.motion_mode, self.motion_scale)
+        self.hill_motion = motion.MotionDetector(self.motion_mode, self.motion_scale)
         
         self.ped_left_buffer = 60 # lateral pixel buffers for pedestrian detection
         self.ped_right_buffer = 80
@@ -138,35 +191,50 @@ class Driver():
         self.boost_count = 0
         self.boost_cycle = 0
 
+        # subscribe last, the callback uses the state set up above. The large buffer keeps rospy
+        # from queueing up old frames in the socket, which makes images arrive late
+        rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback, queue_size=1, buff_size=2**24)
 
     # callback function for camera subscriber
     def callback(self, msg):
-        self.img = self.bridge.imgmsg_to_cv2(msg, 'bgr8')
-        self.img_height, self.img_width = self.img.shape[:2]
         self.cycle_count += 1
-        self.dt = rospy.Time.now().to_sec() - self.last_time
-        self.last_time = rospy.Time.now().to_sec()
+        now = rospy.Time.now().to_sec()
+        stamp = msg.header.stamp.to_sec() or now # unstamped images are as old as their arrival
+        frame = self.decoder.decode_frame(msg, self.cycle_count, stamp, now)
+        self.img_height, self.img_width = frame.shape[:2]
+        self.mailbox.put(frame)
+        # time between camera frames, from the stamps so transport jitter doesn't show up in it.
+        # a repeated or out of order stamp keeps the previous dt, the PID divides by it
+        if self.last_time is not None and stamp > self.last_time:
+            self.dt = stamp - self.last_time
+        self.last_time = stamp
         if self.cycle_count > 1700:
-            for i in range(my_bot.num_signs):
-                message = String()
-                prediction = my_bot.read_sign(my_bot.signs[i])
-                message.data = "Broda,adorb,"+str(i+1)+","+prediction
-                self.score_pub.publish(message)
-            end_timer = String()
-            end_timer.data = "Broda,adorb,-1,NA"
-            self.score_pub.publish(end_timer)
+            self.submit_clues()
+
+    def next_frame(self):
+        """
+        Blocks until the camera delivers a frame the control loop hasn't picked up yet, so loops
+        never spin on a frame that has already been processed.
+
+        Returns:
+            FrameContext or None: The new frame, None if ROS shut down before one arrived.
+        """
+        frame = self.mailbox.take(self.processed_seq, self.frame_wait_timeout, rospy.is_shutdown)
+        if frame is not None:
+            self.frame = frame
+            self.processed_seq = frame.seq
+        return frame
 
     def find_road_centre(self, img, y, width, height, ret_sides=False):
-        left_index = right_index = -1
-        for i in range(width):
-            if img[height - y, i] == 255 and left_index == -1:
-                left_index = i
-            elif img[height - y, i] == 255 and left_index != -1:
-                right_index = i
+        left_index, right_index = scanline.row_edges(img[height - y])
 
         if ret_sides:
             return left_index, right_index
 
+        return self.road_centre_from_sides(left_index, right_index, width)
+
+    # returns the road centre from the road line pixels found in one row, -1 if a side is missing
+    def road_centre_from_sides(self, left_index, right_index, width):
         # print(f'index difference: {right_index - left_index}')
 
         road_centre = -1
@@ -202,36 +270,76 @@ class Driver():
 
         return road_centre
     
+    def fit_road_centre(self, frame, mask=None):
+        """
+        Finds the road centre from a line fitted through the centres of several rows around the 
+        road_buffer row, so a single glitched row doesn't flip the error.
+
+        Args:
+            frame (FrameContext): The camera frame, used for the road threshold when mask is None.
+            mask (numpy.ndarray, optional): A full frame road mask, like those of the desert and 
+                                            mountain states.
+
+        Returns:
+            road_centre (int): The x coordinate of the fitted road centre, -1 if too few rows 
+                               have both road lines.
+        """
+        width = self.img_width
+        ref_row = self.img_height - self.road_buffer
+        rows = ref_row + self.fit_row_spacing * (np.arange(self.fit_num_rows) - self.fit_num_rows // 2)
+        rows = np.unique(np.clip(rows, 0, self.img_height - 1))
+        if mask is None:
+            # threshold only the thin band of rows that gets sampled
+            band = frame.region_mask('road_white', 0, rows[0], width, rows[-1] + 1)[rows - rows[0]]
+        else:
+            band = mask[rows]
+
+        # same rules as road_centre_from_sides, on every row at once
+        left, right = scanline.band_edges(band)
+        found = (left != -1) & (right != -1)
+        centres = np.where(right - left > self.road_line_width, (left + right) // 2,
+                           np.where(left < width // 2, (left + width) // 2, right // 2))
+        road_centre = scanline.fit_centre(rows[found], centres[found], ref_row, self.fit_degree, self.fit_max_outlier)
+        if road_centre is None:
+            return -1
+        return int(min(max(round(road_centre), 0), width - 1))
+
     # returns the error between the centre of the road and the centre of a thresholded image
     # for either a road or desert image, default is road
     # returns error of 0 if no road lines are found on either side
     # enters the truck state if no road is detected and have reached the crosswalk
     def get_error(self, img):
+        frame = frame_context.wrap(img)
         if self.state == 'road' or self.state == 'truck':
-            gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            mask = cv2.inRange(gray_img, self.road_min_white_val, self.road_max_white_val)
+            # only the row the road centre is read from is converted and thresholded
+            row = self.img_height - self.road_buffer
+            mask = frame.region_mask('road_white', 0, row, self.img_width, row + 1)
+            left_index, right_index = scanline.row_edges(mask[0])
         elif self.state == 'desert':
-            mask = cv2.cvtColor(self.thresh_desert(img), cv2.COLOR_BGR2GRAY)
+            mask = cv2.cvtColor(self.thresh_desert(frame), cv2.COLOR_BGR2GRAY)
             self.road_buffer = self.desert_road_buffer
             # cv2.imshow('desert mask', cv2.resize(mask, (self.img_width // 2, self.img_height // 2)))
             # cv2.waitKey(1)
         elif self.state == 'tunnel':
-            mask = self.find_tunnel(img, ret_mask=True)
+            mask = self.find_tunnel(frame, ret_mask=True)
             self.road_buffer = self.tunnel_pid_height
             self.road_line_width = 350
         elif self.state == 'mountain':
-            mask = cv2.cvtColor(self.thresh_desert(img), cv2.COLOR_BGR2GRAY)
+            mask = cv2.cvtColor(self.thresh_desert(frame), cv2.COLOR_BGR2GRAY)
             self.road_buffer = 215
             self.road_line_width = 450
             # cv2.imshow('mountain mask', cv2.resize(mask, (self.img_width // 2, self.img_height // 2)))
             # cv2.waitKey(1)
-            uh_road = 37; us_road = 255; uv_road = 255
-            lh_road = 0; ls_road = 27; lv_road = 110
-            lower_hsv_road = np.array([lh_road, ls_road, lv_road])
-            upper_hsv_road = np.array([uh_road, us_road, uv_road])
-            road_mask = cv2.inRange(cv2.cvtColor(img, cv2.COLOR_BGR2HSV), lower_hsv_road, upper_hsv_road)
-
-        road_centre = self.find_road_centre(mask, self.road_buffer, self.img_width, self.img_height)
+            road_mask = frame.mask('mountain_road')
+
+        if self.error_mode == 'fit' and self.state in self.fit_error_states:
+            # the road and truck masks are a single row, the fit thresholds its own band instead
+            full_mask = mask if mask.shape[0] == self.img_height else None
+            road_centre = self.fit_road_centre(frame, full_mask)
+        elif self.state == 'road' or self.state == 'truck':
+            road_centre = self.road_centre_from_sides(left_index, right_index, self.img_width)
+        else:
+            road_centre = self.find_road_centre(mask, self.road_buffer, self.img_width, self.img_height)
         # mask_image = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
         # cv2.circle(mask_image, (road_centre, self.img_height - self.road_buffer), 5, (0, 0, 255), -1)
         # cv2.imshow('mask', cv2.resize(mask_image, (self.img_width // 2, self.img_height // 2)))
@@ -257,50 +365,49 @@ class Driver():
             self.boost = True
         return error
     
-    def check_red(self, img, ret_angle=False, ret_y=False):
-        uh_red = 255; us_red = 255; uv_red = 255
-        lh_red = 90; ls_red = 50; lv_red = 230
-        lower_hsv_red = np.array([lh_red, ls_red, lv_red])
-        upper_hsv_red = np.array([uh_red, us_red, uv_red])
-        
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
-        red_mask = cv2.inRange(hsv_img, lower_hsv_red, upper_hsv_red)
+    # largest blob of a line colour, from the tracker when line tracking is on
+    def find_line(self, img, tracker):
+        frame = frame_context.wrap(img)
+        if self.track_lines:
+            return tracker.update(frame)
+        return line_tracker.largest_line(frame.mask(tracker.colour))
 
-        contours, _ = cv2.findContours(red_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+    def check_red(self, img, ret_angle=False, ret_y=False):
+        line = self.find_line(img, self.red_tracker)
+        if line is None:
             return False
 
-        largest_contour = max(contours, key=cv2.contourArea)
-        rect = cv2.minAreaRect(largest_contour)
-
         if not ret_angle and not ret_y:
-            if cv2.contourArea(largest_contour) < self.red_line_min_area:
+            if line.area < self.red_line_min_area:
                 return False
             else:
                 return True
         elif ret_angle:
-            return rect[2]
+            return line.angle
         elif ret_y:
-            return rect[0][1]
+            return line.y
 
     # return true if the pedestrian is on the cross walk or within the 
     def check_pedestrian(self, img):
-        cropped_img = img[self.ped_crop_y_min:self.ped_crop_y_max, self.ped_crop_x_min:self.ped_crop_x_max]
-        height, width = cropped_img.shape[:2]
-        fg_mask = self.bg_sub.apply(cropped_img)
+        frame = frame_context.wrap(img)
+        height = self.ped_crop_y_max - self.ped_crop_y_min
+        width = self.ped_crop_x_max - self.ped_crop_x_min
+        fg_mask = self.ped_motion.apply(frame)
 
-        contours, _ = cv2.findContours(fg_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+        fg_blobs = blobs.Blobs(fg_mask)
+        if len(fg_blobs) == 0:
             return False
-        largest_contour = max(contours, key=cv2.contourArea)
+        largest = fg_blobs.largest()
 
-        if cv2.contourArea(largest_contour) < self.ped_min_area:
+        if self.ped_motion.area_to_full(fg_blobs.areas[largest]) < self.ped_min_area:
             return False
 
-        x, y, w, h = cv2.boundingRect(largest_contour)
+        # the mask is shrunk, scale the box back to crop pixels
+        x, y, w, h = (self.ped_motion.to_full(v) for v in fg_blobs.box(largest))
 
-        gray_img = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
-        white_mask = cv2.inRange(gray_img, self.road_min_white_val, self.road_max_white_val)
+        # only the crosswalk crop is thresholded, nothing else in this state needs the full frame
+        white_mask = frame.region_mask('road_white', self.ped_crop_x_min, self.ped_crop_y_min,
+                                       self.ped_crop_x_max, self.ped_crop_y_max)
         ped_height_from_bottom = height - (y + h - 1)
         road_left, road_right = self.find_road_centre(white_mask, ped_height_from_bottom, width, height, ret_sides=True)
 
@@ -320,52 +427,46 @@ class Driver():
         else:
             return False
         
-    def drive_robot(self, linear, angular):
-        if linear >  self.move.linear.x + self.speed_buffer:
-            rate = rospy.Rate(self.accel_freq)
-            vel = self.move.linear.x
-            while vel < linear:
-                self.move.linear.x = vel
-                self.move.angular.z = 0
-                self.vel_pub.publish(self.move)
-                vel += self.accel_rate
-                rate.sleep()
-
-        elif linear < self.move.linear.x - self.speed_buffer:
-            vel = self.move.linear.x
-            rate = rospy.Rate(self.accel_freq)
-            while vel > linear:
-                self.move.linear.x = vel
-                self.move.angular.z = 0
-                self.vel_pub.publish(self.move)
-                vel -= self.decel_rate
-                rate.sleep()
-        # elif my_bot.num_signs == 2:
-        #     self.move.linear.x = linear - 0.2
-        #     self.move.angular.z = angular
-        #     self.vel_pub.publish(self.move) 
-        else:
-            self.move.linear.x  = linear
-            self.move.angular.z = angular
-            self.vel_pub.publish(self.move)
+    # sets the velocity the publisher thread drives at, big speed changes are ramped there.
+    # with wait, blocks until the ramp is done, for manoeuvres that are the ramp itself
+    def drive_robot(self, linear, angular, wait=False):
+        self.latency.decision(self.frame, rospy.get_time())
+        self.velocity.set_target(linear, angular, self.frame)
+        if wait:
+            self.velocity.wait()
+
+    # publishes a command from the velocity thread, frame is the frame it was decided on
+    def publish_move(self, move, frame=None, keepalive=False):
+        self.vel_pub.publish(move)
+        now = rospy.get_time()
+        self.latency.command(frame, now, keepalive)
+        if self.first_cmd_time is None:
+            self.first_cmd_time = time.perf_counter() - process_start_time
+            self.last_latency_report = now
+            print(f'sign_reader import: {sign_reader_import_time:.2f}s, '
+                  f'first cmd_vel: {self.first_cmd_time:.2f}s after start')
+        elif now - self.last_latency_report >= self.latency_report_period:
+            self.last_latency_report = now
+            print(self.latency.stats())
 
     # returns true if it detects that the truck is big, if at intersection, returns contour area and mid x point
     def check_truck(self, img, at_intersection=False):
-        fg_mask = self.bg_sub.apply(img)
-        contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+        fg_mask = self.truck_motion.apply(frame_context.wrap(img))
+        fg_blobs = blobs.Blobs(fg_mask)
+        if len(fg_blobs) == 0:
             return 0, 0 if at_intersection else True
-        largest_contour = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest_contour)
+        largest = fg_blobs.largest()
+        x, y, w, h = fg_blobs.box(largest)
+        area = self.truck_motion.area_to_full(fg_blobs.areas[largest])
 
         # cv2.imshow('fg mask', fg_mask)
         # cv2.waitKey(1)
 
         if at_intersection:
-            return cv2.contourArea(largest_contour), x + w // 2
+            return area, self.truck_motion.to_full(x + w / 2)
         
         # TODO: check if this is used, don't think it is
-        elif cv2.contourArea(largest_contour) > self.truck_min_area:
+        elif area > self.truck_min_area:
             print('testing code not used for truck, here')
             return True
         else:
@@ -374,16 +475,8 @@ class Driver():
     
     # returns true if there is magenta at or below the point where we detect for road lines
     def check_magenta(self, img, ret_angle=False, ret_y=False, ret_midx=False):
-        uh_mag = 175; us_mag = 255; uv_mag = 255
-        lh_mag = 150; ls_mag = 90; lv_mag = 110
-        lower_hsv_mag = np.array([lh_mag, ls_mag, lv_mag])
-        upper_hsv_mag = np.array([uh_mag, us_mag, uv_mag])
-
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        magenta_mask = cv2.inRange(hsv_img, lower_hsv_mag, upper_hsv_mag)
-
-        contours, _ = cv2.findContours(magenta_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+        line = self.find_line(img, self.magenta_tracker)
+        if line is None:
             if not ret_angle and not ret_y and not ret_midx:
                 return False
             elif ret_angle:
@@ -392,9 +485,8 @@ class Driver():
                 return self.img_height - 1 if self.state == 'desert' else 0
             elif ret_midx:
                 return 0
-        largest_contour = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest_contour)
-        rect = cv2.minAreaRect(largest_contour)
+        x, y, w, h = line.box
+        area = line.area
 
         if self.state == 'truck':
             if y >= self.img_height - self.road_buffer:
@@ -404,44 +496,43 @@ class Driver():
         
         elif self.state == 'desert':
             if ret_angle:
-                return rect[2]
+                return line.angle
             elif ret_y:
-                if cv2.contourArea(largest_contour) < self.desert_past_magenta_line_area:
+                if area < self.desert_past_magenta_line_area:
                     return self.img_height -1
                 else:
-                    return rect[0][1]
-            elif cv2.contourArea(largest_contour) > self.desert_min_magenta_area:
+                    return line.y
+            elif area > self.desert_min_magenta_area:
                 return True
             else:
                 return False
         
         elif self.state == 'yoda':
             if ret_midx:
-                return x + w // 2
+                return line.mid_x
             elif ret_y:
-                return y + h // 2 #if cv2.contourArea(largest_contour) > self.yoda_mag_min_area_for_y else 0
+                return y + h // 2 #if area > self.yoda_mag_min_area_for_y else 0
             elif ret_angle:
-                return rect[2]
+                return line.angle
             else: 
-                return True if cv2.contourArea(largest_contour) > self.yoda_find_mag_min_area else False
+                return True if area > self.yoda_find_mag_min_area else False
             
+    # simplified polygons of the long, tall contours of a desert mask, longest first
+    def desert_polygons(self, mask):
+        desert_blobs = blobs.Blobs(mask, cv2.RETR_TREE)
+        keep = (desert_blobs.perimeters > self.desert_min_arc_length) & (desert_blobs.boxes[:, 3] > self.desert_line_cnt_min_height)
+        order = [i for i in np.argsort(-desert_blobs.perimeters, kind='stable') if keep[i]]
+        if len(order) == 0:
+            return []
+        epsilon = 0.01 * desert_blobs.perimeters[order[0]]
+        return [cv2.approxPolyDP(desert_blobs.contours[i], epsilon, True) for i in order]
+
     def thresh_desert(self, img):
-        uh = 37; us = 98; uv = 255
-        lh = 13; ls = 35; lv = 179
-        lower_hsv = np.array([lh, ls, lv])
-        upper_hsv = np.array([uh, us, uv])
-
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv_img, lower_hsv, upper_hsv)
-
-        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        contours = sorted(contours, key=lambda contour: cv2.arcLength(contour, True), reverse=True) # don't think this line is necessary
-        contours = [cnt for cnt in contours if cv2.arcLength(cnt, True) > self.desert_min_arc_length 
-                    and cv2.boundingRect(cnt)[3] > self.desert_line_cnt_min_height ]
-        if len(contours) == 0:
+        frame = frame_context.wrap(img)
+        img = frame.img
+        approx_cnts = self.desert_polygons(frame.mask('desert'))
+        if len(approx_cnts) == 0:
                     return np.zeros_like(img)
-        epsilon = 0.01 * cv2.arcLength(contours[0], True)
-        approx_cnts = [cv2.approxPolyDP(cnt, epsilon, True) for cnt in contours]
 
         blank_img = np.zeros_like(img)
 
@@ -449,17 +540,9 @@ class Driver():
             return cv2.fillPoly(blank_img, approx_cnts, (255, 255, 255))
         elif self.state == 'mountain':
             road_1 = cv2.fillPoly(blank_img, approx_cnts, (255, 255, 255))
-            lv2 = 173
-            lower_hsv2 = np.array([lh, ls, lv2])
-            mask2 = cv2.inRange(hsv_img, lower_hsv2, upper_hsv)
-            contours2, _ = cv2.findContours(mask2, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-            contours2 = sorted(contours2, key=lambda contour: cv2.arcLength(contour, True), reverse=True)
-            contours2 = [cnt for cnt in contours2 if cv2.arcLength(cnt, True) > self.desert_min_arc_length
-                        and cv2.boundingRect(cnt)[3] > self.desert_line_cnt_min_height]
-            if len(contours2) == 0:
+            approx_cnts2 = self.desert_polygons(frame.mask('desert_mountain'))
+            if len(approx_cnts2) == 0:
                 return road_1
-            epsilon2 = 0.01 * cv2.arcLength(contours2[0], True)
-            approx_cnts2 = [cv2.approxPolyDP(cnt, epsilon2, True) for cnt in contours2]
             blank_img2 = np.zeros_like(img)
             road_2 = cv2.fillPoly(blank_img2, approx_cnts2, (255, 255, 255))
 
@@ -470,76 +553,47 @@ class Driver():
         return blank_img
     
     def check_yoda(self, img):
-        uh = 68; us = 255; uv = 255
-        lh = 57; ls = 96; lv = 89
-        lower_hsv = np.array([lh, ls, lv])
-        upper_hsv = np.array([uh, us, uv])
-
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv_img, lower_hsv, upper_hsv)
-
-        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+        yoda_blobs = blobs.Blobs(frame_context.wrap(img).mask('yoda'))
+        if len(yoda_blobs) == 0:
             return False
-        largest_contour = max(contours, key=cv2.contourArea)
-        if cv2.contourArea(largest_contour) > 800:
+        if yoda_blobs.areas.max() > 800:
             return True
         else:
             return False
 
     # returns true if cactus contour area within range
     def check_cactus(self, img):
-        uh_cactus = 66; us_cactus = 255; uv_cactus = 255
-        lh_cactus = 56; ls_cactus = 86; lv_cactus = 63
-        lower_hsv_cactus = np.array([lh_cactus, ls_cactus, lv_cactus])
-        upper_hsv_cactus = np.array([uh_cactus, us_cactus, uv_cactus])
-
-        uh_yoda = 68; us_yoda = 255; uv_yoda = 255
-        lh_yoda = 57; ls_yoda = 96; lv_yoda = 89
-        lower_hsv_yoda = np.array([lh_yoda, ls_yoda, lv_yoda])
-        upper_hsv_yoda = np.array([uh_yoda, us_yoda, uv_yoda])
-
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        cactus_mask = cv2.inRange(hsv_img, lower_hsv_cactus, upper_hsv_cactus)
-        yoda_mask = cv2.inRange(hsv_img, lower_hsv_yoda, upper_hsv_yoda)
-        yoda_mask = cv2.bitwise_not(yoda_mask)
+        frame = frame_context.wrap(img)
+        cactus_mask = frame.mask('cactus')
+        yoda_mask = cv2.bitwise_not(frame.mask('yoda'))
 
         mask = cv2.bitwise_and(cactus_mask, yoda_mask)
 
-        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+        cactus_blobs = blobs.Blobs(mask)
+        if len(cactus_blobs) == 0:
             return False
-        largest_contour = max(contours, key=cv2.contourArea)
-        if self.cactus_min_area < cv2.contourArea(largest_contour) < self.cactus_max_area:
+        if self.cactus_min_area < cactus_blobs.areas.max() < self.cactus_max_area:
             return True
         else:
             return False
         
     def check_hill_stop(self, img):
-        fg_mask = self.bg_sub.apply(img)
-        contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE) 
-        if len(contours) == 0:
+        fg_blobs = blobs.Blobs(self.hill_motion.apply(frame_context.wrap(img)))
+        if len(fg_blobs) == 0:
             return True
         else:
-            largest_contour = max(contours, key=cv2.contourArea)
-            return True if cv2.contourArea(largest_contour) < 30 else False
+            return True if self.hill_motion.area_to_full(fg_blobs.areas.max()) < 30 else False
     
     # returns the centre point of the bounding rectangle of the tunnel, img width if no tunnel found by default
     # can also return the contour area and the mask image
     def find_tunnel(self, img, ret_area=False, ret_mask=False):
-        uh = 9; us = 255; uv = 255
-        lh = 0; ls = 106; lv = 66
-        lower_hsv= np.array([lh, ls, lv])
-        upper_hsv= np.array([uh, us, uv])
-
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv_img, lower_hsv, upper_hsv)
+        mask = frame_context.wrap(img).mask('tunnel')
 
         if ret_mask:
             return mask
 
-        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        contours = [cnt for cnt in contours if cv2.contourArea(cnt) > self.tunnel_min_area]
+        tunnel_blobs = blobs.Blobs(mask, cv2.RETR_TREE) # every contour counts, holes included
+        contours = [tunnel_blobs.contours[i] for i in np.flatnonzero(tunnel_blobs.areas > self.tunnel_min_area)]
         if len(contours) == 0:
             return -1 if not ret_area else 0
         combined_contour = np.concatenate(contours)
@@ -548,13 +602,9 @@ class Driver():
 
     # finds middle x value of sign at top of mountain
     def find_mountain_sign(self, img, check_area=False):
-        lower_hsv = (5,20,0)
-        upper_hsv = (150,255,255)
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        blue_mask = cv2.inRange(hsv_img, lower_hsv, upper_hsv)
-
-        gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        white_mask = cv2.inRange(gray_img, 95, 105)
+        frame = frame_context.wrap(img)
+        blue_mask = frame.mask('sign_blue')
+        white_mask = frame.mask('mountain_sign_white')
 
         blue_mask_not = cv2.bitwise_not(blue_mask)
         combined_mask = cv2.bitwise_and(white_mask, blue_mask_not)
@@ -562,17 +612,34 @@ class Driver():
         # cv2.imshow('sign mask', cv2.resize(combined_mask, (self.img_width // 2, self.img_height // 2)))
         # cv2.waitKey(1)
 
-        contours, _ = cv2.findContours(combined_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0:
+        sign_blobs = blobs.Blobs(combined_mask)
+        if len(sign_blobs) == 0:
             return -1
-        largest_contour = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest_contour)
+        largest = sign_blobs.largest()
+        x, y, w, h = sign_blobs.box(largest)
         if check_area:
-            return cv2.contourArea(largest_contour) > 25000
+            return sign_blobs.areas[largest] > 25000
         else:
-            return x + w // 2 if cv2.contourArea(largest_contour) > 5000 else -1
+            return x + w // 2 if sign_blobs.areas[largest] > 5000 else -1
 
     
+    # reads all stored signs (cached after the first read) and publishes each clue, then stops the timer
+    def submit_clues(self):
+        try:
+            predictions = my_bot.read_stored_signs()
+        except RuntimeError as e: # no letter model, only send the reads that already finished
+            print('could not read signs: ' + str(e))
+            predictions = [my_bot.read_cache.get(key) for key in my_bot.sign_hashes[:my_bot.num_signs]]
+        for i, prediction in enumerate(predictions):
+            if prediction is None:
+                continue
+            message = String()
+            message.data = "Broda,adorb,"+str(i+1)+","+prediction
+            self.score_pub.publish(message)
+        end_timer = String()
+        end_timer.data = "Broda,adorb,-1,NA"
+        self.score_pub.publish(end_timer)
+
     # placeholder for start function
     def start(self):
         # start the timer
@@ -586,273 +653,291 @@ class Driver():
     # main loop for the driver
     def run(self):
         while not rospy.is_shutdown():
-            if self.img is None:
+            if self.next_frame() is None:
                 continue
 
-            if self.cycle_count > 1700:
-                self.state = 'clue submission'
+            # a state that leaves the loop with break is still timed when the probe exits
+            with instrumentation.timing.probe('state', self.state):
+                if self.cycle_count > 1700:
+                    self.state = 'clue submission'
             
-            # --------------- initialization state ---------------
-            elif self.state == 'init':
-                self.start()
-
-            # -------------------- road state --------------------
-            elif self.state == 'road':
-                cropped_img = my_bot.check_if_sign(self.img) # returns None if no sign detected
-                if cropped_img is not None:
-                    my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                if self.reached_crosswalk == False and self.check_red(self.img):
-                    print('red detected, going to ped state')
-                    self.state = 'ped'
-                # elif self.reached_truck and self.check_magenta(self.img):
-                #     print('magenta detected, going to desert state')
-                #     self.state = 'desert'
-                else:
-                    error = self.kp * self.get_error(self.img)
-                    # print(error)
-                    if my_bot.num_signs == 2:
-                        self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
+                # --------------- initialization state ---------------
+                elif self.state == 'init':
+                    self.start()
+
+                # -------------------- road state --------------------
+                elif self.state == 'road':
+                    cropped_img = my_bot.check_if_sign(self.frame, self.state) # returns None if no sign detected
                     if cropped_img is not None:
-                        self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
+                        my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
+                    if self.reached_crosswalk == False and self.check_red(self.frame):
+                        print('red detected, going to ped state')
+                        self.state = 'ped'
+                    # elif self.reached_truck and self.check_magenta(self.frame):
+                    #     print('magenta detected, going to desert state')
+                    #     self.state = 'desert'
                     else:
-                        self.drive_robot(self.lin_speed, self.rot_speed * error)
-
-            # ----------------- pedestrian state -----------------
-            elif self.state == 'ped':
-                # angle to be straight on with crosswalk
-                while self.red_line_min_angle < self.check_red(self.img, ret_angle=True) < self.red_line_max_angle:
-                    angle = self.check_red(self.img, ret_angle=True)
-                    if angle < 45:
-                        self.drive_robot(self.red_line_approach_lin_vel, -1 * angle * self.red_line_approach_rot_vel)
-                    else:
-                        self.drive_robot(self.red_line_approach_lin_vel, (90 - angle) * self.red_line_approach_rot_vel)
+                        error = self.kp * self.get_error(self.frame)
+                        # print(error)
+                        if my_bot.num_signs == 2:
+                            self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
+                        if cropped_img is not None:
+                            self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
+                        else:
+                            self.drive_robot(self.lin_speed, self.rot_speed * error)
+
+                # ----------------- pedestrian state -----------------
+                elif self.state == 'ped':
+                    # angle to be straight on with crosswalk
+                    while self.red_line_min_angle < self.check_red(self.frame, ret_angle=True) < self.red_line_max_angle:
+                        angle = self.check_red(self.frame, ret_angle=True)
+                        if angle < 45:
+                            self.drive_robot(self.red_line_approach_lin_vel, -1 * angle * self.red_line_approach_rot_vel)
+                        else:
+                            self.drive_robot(self.red_line_approach_lin_vel, (90 - angle) * self.red_line_approach_rot_vel)
+                        self.next_frame()
                 
-                # get close to crosswalk
-                while self.check_red(self.img, ret_y=True) < self.red_line_stop_y:
-                    self.drive_robot(self.lin_speed, 0)
+                    # get close to crosswalk
+                    while self.check_red(self.frame, ret_y=True) < self.red_line_stop_y:
+                        self.drive_robot(self.lin_speed, 0)
+                        self.next_frame()
 
-                self.drive_robot(0, 0)
+                    self.drive_robot(0, 0)
 
-                if self.check_pedestrian(self.img):
-                    # print('pedestrian detected, waiting...')
-                    self.ped_safe_count = 0
-                else:
-                    self.ped_safe_count += 1
-                    if self.ped_safe_count > self.ped_safe_count_buffer:
-                        # print('no pedestrian, going!')
-                        self.drive_robot(self.ped_lin_speed, self.ped_ang_speed)
-                        # rospy.sleep(self.ped_sleep_time)
-                        print('crossing crosswalk, going back to road pid state')
-                        self.state = 'road'
-                        self.reached_crosswalk = True
+                    if self.check_pedestrian(self.frame):
+                        # print('pedestrian detected, waiting...')
+                        self.ped_safe_count = 0
+                    else:
+                        self.ped_safe_count += 1
+                        if self.ped_safe_count > self.ped_safe_count_buffer:
+                            # print('no pedestrian, going!')
+                            self.drive_robot(self.ped_lin_speed, self.ped_ang_speed, wait=True) # the ramp is the sprint across
+                            # rospy.sleep(self.ped_sleep_time)
+                            print('crossing crosswalk, going back to road pid state')
+                            self.state = 'road'
+                            self.reached_crosswalk = True
             
-            # ------------------- truck state --------------------
-            elif self.state == 'truck':
-                cropped_img = my_bot.check_if_sign(self.img) # returns None if no sign detected
-                if cropped_img is not None:
-                    my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                if not self.reached_truck:
-                    self.drive_robot(0, 0)
-                    truck_area, truck_mid = self.check_truck(self.img, at_intersection=True)
-                    if self.cycle_count < self.truck_init_cycle + self.truck_cycle_buffer:
-                        # print('too early to tell')
-                        pass
-                    elif truck_mid < self.img_width // 2 and truck_area > self.truck_left_area:
-                        print('truck close but on left, going right')
-                        self.truck_turn_dir = 'right'
-                        self.reached_truck = True
-                    elif truck_area > self.truck_wait_area:
-                        print('truck is close, waiting...')
+                # ------------------- truck state --------------------
+                elif self.state == 'truck':
+                    cropped_img = my_bot.check_if_sign(self.frame, self.state) # returns None if no sign detected
+                    if cropped_img is not None:
+                        my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
+                    if not self.reached_truck:
                         self.drive_robot(0, 0)
-                        self.truck_turn_dir = 'wait'
+                        truck_area, truck_mid = self.check_truck(self.frame, at_intersection=True)
+                        if self.cycle_count < self.truck_init_cycle + self.truck_cycle_buffer:
+                            # print('too early to tell')
+                            pass
+                        elif truck_mid < self.img_width // 2 and truck_area > self.truck_left_area:
+                            print('truck close but on left, going right')
+                            self.truck_turn_dir = 'right'
+                            self.reached_truck = True
+                        elif truck_area > self.truck_wait_area:
+                            print('truck is close, waiting...')
+                            self.drive_robot(0, 0)
+                            self.truck_turn_dir = 'wait'
+                        else:
+                            print('going left')
+                            self.truck_turn_dir = 'left'
+                            self.reached_truck = True
+                    elif self.truck_turn_dir == 'right':
+                        error = self.truck_right_kp * self.get_error(self.frame)
+                        self.drive_robot(self.truck_right_lin_speed, self.rot_speed * error)
                     else:
-                        print('going left')
-                        self.truck_turn_dir = 'left'
-                        self.reached_truck = True
-                elif self.truck_turn_dir == 'right':
-                    error = self.truck_right_kp * self.get_error(self.img)
-                    self.drive_robot(self.truck_right_lin_speed, self.rot_speed * error)
-                else:
-                    error = self.kp * self.get_error(self.img)
+                        error = self.kp * self.get_error(self.frame)
+                        if cropped_img is not None:
+                            self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
+                        else:
+                            self.drive_robot(self.lin_speed, self.rot_speed * error)
+
+                    if self.check_magenta(self.frame):
+                        print('magenta detected, going to desert state')
+                        self.state = 'desert'
+                        self.drive_robot(self.lin_speed, 0)
+                        rospy.sleep(self.truck_to_desert_sleep)
+
+                # ------------------ desert state --------------------
+                elif self.state == 'desert':
+                    cropped_img = my_bot.check_if_sign(self.frame, self.state) # returns None if no sign detected
                     if cropped_img is not None:
-                        self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
+                        my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
+                    if self.check_magenta(self.frame):
+                        self.drive_robot(0, 0)
+                        print('detected magenta')
+                        while self.magneta_min_angle < self.check_magenta(self.frame, ret_angle=True) < self.magneta_max_angle:
+                            angle = self.check_magenta(self.frame, ret_angle=True)
+                            if angle < 45:
+                                self.drive_robot(self.magenta_angle_lin_speed, -1 * angle * self.magenta_angle_rot_speed)
+                            else:
+                                self.drive_robot(self.magenta_angle_lin_speed, (90 - angle) * self.magenta_angle_rot_speed)
+                            self.next_frame()
+
+                        print('done angling, moving closer')
+                        while self.check_magenta(self.frame, ret_y=True) < self.img_height - 10:
+                            self.drive_robot(self.magenta_angle_lin_speed, 0) 
+                            self.next_frame()
+                        self.drive_robot(0, 0)
+                        print('going to yoda state')
+                        self.state = 'yoda'
                     else:
-                        self.drive_robot(self.lin_speed, self.rot_speed * error)
-
-                if self.check_magenta(self.img):
-                    print('magenta detected, going to desert state')
-                    self.state = 'desert'
-                    self.drive_robot(self.lin_speed, 0)
-                    rospy.sleep(self.truck_to_desert_sleep)
-
-            # ------------------ desert state --------------------
-            elif self.state == 'desert':
-                cropped_img = my_bot.check_if_sign(my_bot.img) # returns None if no sign detected
-                if cropped_img is not None:
-                    my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                if self.check_magenta(self.img):
-                    self.drive_robot(0, 0)
-                    print('detected magenta')
-                    while self.magneta_min_angle < self.check_magenta(self.img, ret_angle=True) < self.magneta_max_angle:
-                        angle = self.check_magenta(self.img, ret_angle=True)
-                        if angle < 45:
-                            self.drive_robot(self.magenta_angle_lin_speed, -1 * angle * self.magenta_angle_rot_speed)
+                        error = self.kp * self.get_error(self.frame)
+                        if cropped_img is not None:
+                            self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
                         else:
-                            self.drive_robot(self.magenta_angle_lin_speed, (90 - angle) * self.magenta_angle_rot_speed)
+                            self.drive_robot(self.lin_speed, self.rot_speed * error)
 
-                    print('done angling, moving closer')
-                    while self.check_magenta(self.img, ret_y=True) < self.img_height - 10:
-                        self.drive_robot(self.magenta_angle_lin_speed, 0) 
-                    self.drive_robot(0, 0)
-                    print('going to yoda state')
-                    self.state = 'yoda'
-                else:
-                    error = self.kp * self.get_error(self.img)
+                # -------------------- yoda state --------------------
+                elif self.state == 'yoda':
+                    cropped_img = my_bot.check_if_sign(self.frame, self.state) # returns None if no sign detected
                     if cropped_img is not None:
-                        self.drive_robot(self.sign_lin_speed, self.sign_rot_speed * error)
-                    else:
-                        self.drive_robot(self.lin_speed, self.rot_speed * error)
-
-            # -------------------- yoda state --------------------
-            elif self.state == 'yoda':
-                cropped_img = my_bot.check_if_sign(my_bot.img) # returns None if no sign detected
-                if cropped_img is not None:
-                    my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                if not self.reached_yoda:
-                    while self.check_yoda(self.img) and self.cycle_count < 1500:
-                        print('detecting yoda')
+                        my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
+                    if not self.reached_yoda:
+                        while self.check_yoda(self.frame) and self.cycle_count < 1500:
+                            print('detecting yoda')
+                            self.drive_robot(0, 0)
+                            self.next_frame()
+                        print('getting close to cactus')
+                        while not self.check_cactus(self.frame) and self.cycle_count < 1500:
+                            self.drive_robot(self.cactus_lin_speed, 0)
+                            self.next_frame()
+                        print('turning to see tunnel')
+                        while self.find_tunnel(self.frame) < self.tunnel_mid_x and self.cycle_count < 1500:
+                            self.drive_robot(0, self.tunnel_turn_speed)
+                            self.next_frame()
+                        print('all good, ready to go over the hill')
                         self.drive_robot(0, 0)
-                    print('getting close to cactus')
-                    while not self.check_cactus(self.img) and self.cycle_count < 1500:
-                        self.drive_robot(self.cactus_lin_speed, 0)
-                    print('turning to see tunnel')
-                    while self.find_tunnel(self.img) < self.tunnel_mid_x and self.cycle_count < 1500:
-                        self.drive_robot(0, self.tunnel_turn_speed)
-                    print('all good, ready to go over the hill')
-                    self.drive_robot(0, 0)
-                    self.reached_yoda = True
-                else:
-                    if not self.over_hill:
-                        tunnel_mid = self.find_tunnel(self.img)
-                        if tunnel_mid == -1:
-                            while not self.check_magenta(self.img) and self.cycle_count < 1500:
-                                self.drive_robot(self.hill_lin_speed, self.hill_rot_speed)
-                            print('over the hill now, checking for magenta')
-                            self.over_hill = True
+                        self.reached_yoda = True
+                    else:
+                        if not self.over_hill:
+                            tunnel_mid = self.find_tunnel(self.frame)
+                            if tunnel_mid == -1:
+                                while not self.check_magenta(self.frame) and self.cycle_count < 1500:
+                                    self.drive_robot(self.hill_lin_speed, self.hill_rot_speed)
+                                    self.next_frame()
+                                print('over the hill now, checking for magenta')
+                                self.over_hill = True
+                            else:
+                                error = self.kp * (self.tunnel_mid_x - tunnel_mid) / self.tunnel_mid_x
+                                self.drive_robot(self.lin_speed, self.rot_speed * error)
+                                if self.check_yoda(self.frame):
+                                    self.drive_robot(0, 0)
+                                    rospy.sleep(0.3)
                         else:
-                            error = self.kp * (self.tunnel_mid_x - tunnel_mid) / self.tunnel_mid_x
-                            self.drive_robot(self.lin_speed, self.rot_speed * error)
-                            if self.check_yoda(self.img):
-                                self.drive_robot(0, 0)
-                                rospy.sleep(0.3)
+                            while self.check_magenta(self.frame, ret_y=True) < 408 and self.cycle_count < 1500: 
+                                if self.check_hill_stop(self.frame):
+                                    print('stalled on hill')
+                                    self.drive_robot(0, 0)
+                                    rospy.sleep(0.5)
+                                mag_x = self.check_magenta(self.frame, ret_midx=True)
+                                error = self.kp * (self.yoda_mag_x_mid - mag_x) / self.yoda_mag_x_mid
+                                self.drive_robot(0.6, self.rot_speed * error)
+                                # print('y: ', self.check_magenta(self.frame, ret_y=True))
+                                if self.check_yoda(self.frame):
+                                    self.drive_robot(0, 0)
+                                    rospy.sleep(0.3)
+                                self.next_frame()
+                            print('going straight now')
+                            while self.check_magenta(self.frame, ret_y=True) < 590 and self.cycle_count < 1500:
+                                self.drive_robot(0.5, 0)
+                                # print('y: ', self.check_magenta(self.frame, ret_y=True))
+                                self.next_frame()
+                            print('close to magenta, angling to be straight')
+                            while 0.5 < self.check_magenta(self.frame, ret_angle=True) < 89.5 and self.cycle_count < 1500:
+                                angle = self.check_magenta(self.frame, ret_angle=True)
+                                # print('angle: ', angle)
+                                if angle < 45:
+                                    self.drive_robot(0, -1 * angle * 0.05)
+                                else:
+                                    self.drive_robot(0, (90 - angle) * 0.05)
+                                self.next_frame()
+                            self.drive_robot(0.4, 0)
+                            print('going to tunnel state')
+                            # self.drive_robot(self.lin_speed, -0.8)
+                            rospy.sleep(0.3)
+                            self.state = 'tunnel'
+
+                # ------------------ tunnel state ------------------
+                elif self.state == 'tunnel':
+                    cropped_img = my_bot.check_if_sign(self.frame, self.state) # returns None if no sign detected
+                    if cropped_img is not None:
+                        my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
+                    if self.find_tunnel(self.frame, ret_area=True) > 10000:
+                        self.drive_robot(1.2, 0)
                     else:
-                        while self.check_magenta(self.img, ret_y=True) < 408 and self.cycle_count < 1500: 
-                            if self.check_hill_stop(self.img):
-                                print('stalled on hill')
-                                self.drive_robot(0, 0)
-                                rospy.sleep(0.5)
-                            mag_x = self.check_magenta(self.img, ret_midx=True)
-                            error = self.kp * (self.yoda_mag_x_mid - mag_x) / self.yoda_mag_x_mid
-                            self.drive_robot(0.6, self.rot_speed * error)
-                            # print('y: ', self.check_magenta(self.img, ret_y=True))
-                            if self.check_yoda(self.img):
-                                self.drive_robot(0, 0)
-                                rospy.sleep(0.3)
-                        print('going straight now')
-                        while self.check_magenta(self.img, ret_y=True) < 590 and self.cycle_count < 1500:
+                        print('tunnel contour too small, going to mountain state')
+                        self.state = 'mountain'
+                        rospy.sleep(0.5)
+
+                # ----------------- mountain state -----------------
+                elif self.state == 'mountain':
+                    if not self.found_mountain_lines:
+                        while not np.any(self.thresh_desert(self.frame)) and self.cycle_count < 1500:
+                            # print('no lines found')
                             self.drive_robot(0.5, 0)
-                            # print('y: ', self.check_magenta(self.img, ret_y=True))
-                        print('close to magenta, angling to be straight')
-                        while 0.5 < self.check_magenta(self.img, ret_angle=True) < 89.5 and self.cycle_count < 1500:
-                            angle = self.check_magenta(self.img, ret_angle=True)
-                            # print('angle: ', angle)
-                            if angle < 45:
-                                self.drive_robot(0, -1 * angle * 0.05)
+                            self.next_frame()
+                        self.found_mountain_lines = True
+                        print('found mountain lines, going to pid')
+                        rospy.sleep(0.4)
+                        self.mountain_start_cycle = self.cycle_count
+                    else:
+                        while self.find_mountain_sign(self.frame) == -1 and self.cycle_count < 1500:
+                            error = self.get_error(self.frame)
+                            derivative = (error - self.prev_error) / self.dt
+                            self.prev_error = error
+                            rot_amp = 8 * error + self.kd * derivative
+                            if self.boost and 150 < self.cycle_count - self.mountain_start_cycle and self.cycle_count > self.boost_cycle + 1:
+                                self.drive_robot(0.5, 0.9)
+                                self.boost = False
+                                self.boost_cycle = self.cycle_count
+                                print('boosting!!!')
+                                # self.boost_count += 1
                             else:
-                                self.drive_robot(0, (90 - angle) * 0.05)
-                        self.drive_robot(0.4, 0)
-                        print('going to tunnel state')
-                        # self.drive_robot(self.lin_speed, -0.8)
-                        rospy.sleep(0.3)
-                        self.state = 'tunnel'
-
-            # ------------------ tunnel state ------------------
-            elif self.state == 'tunnel':
-                cropped_img = my_bot.check_if_sign(my_bot.img) # returns None if no sign detected
-                if cropped_img is not None:
-                    my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                if self.find_tunnel(self.img, ret_area=True) > 10000:
-                    self.drive_robot(1.2, 0)
-                else:
-                    print('tunnel contour too small, going to mountain state')
-                    self.state = 'mountain'
-                    rospy.sleep(0.5)
-
-            # ----------------- mountain state -----------------
-            elif self.state == 'mountain':
-                if not self.found_mountain_lines:
-                    while not np.any(self.thresh_desert(self.img)) and self.cycle_count < 1500:
-                        # print('no lines found')
-                        self.drive_robot(0.5, 0)
-                    self.found_mountain_lines = True
-                    print('found mountain lines, going to pid')
-                    rospy.sleep(0.4)
-                    self.mountain_start_cycle = self.cycle_count
-                else:
-                    while self.find_mountain_sign(self.img) == -1 and self.cycle_count < 1500:
-                        error = self.get_error(self.img)
-                        derivative = (error - self.prev_error) / self.dt
-                        self.prev_error = error
-                        rot_amp = 8 * error + self.kd * derivative
-                        if self.boost and 150 < self.cycle_count - self.mountain_start_cycle and self.cycle_count > self.boost_cycle + 1:
-                            self.drive_robot(0.5, 0.9)
-                            self.boost = False
-                            self.boost_cycle = self.cycle_count
-                            print('boosting!!!')
-                            # self.boost_count += 1
+                                rot_speed = 1.2 * rot_amp
+                                if rot_speed < -1.5:
+                                    rot_speed = -1.5
+                                self.drive_robot(0.3, rot_speed)
+                            self.next_frame()
+                        print('found sign, going to sign state')
+                        self.state = 'mountain top'
+
+                # ---------------- mountain top state ---------------
+                elif self.state == 'mountain top':
+                    cropped_img = my_bot.check_if_sign(self.frame, self.state) # returns None if no sign detected
+                    if cropped_img is not None:
+                        my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
+                    if not self.find_mountain_sign(self.frame, check_area=True) and self.cycle_count < 1500:
+                        sign_mid_x = self.find_mountain_sign(self.frame)
+                        print('pid ing to sign')
+                        if sign_mid_x == -1:
+                            self.drive_robot(0.3, 0)
                         else:
-                            rot_speed = 1.2 * rot_amp
-                            if rot_speed < -1.5:
-                                rot_speed = -1.5
-                            self.drive_robot(0.3, rot_speed)
-                    print('found sign, going to sign state')
-                    self.state = 'mountain top'
-
-            # ---------------- mountain top state ---------------
-            elif self.state == 'mountain top':
-                cropped_img = my_bot.check_if_sign(my_bot.img) # returns None if no sign detected
-                if cropped_img is not None:
-                    my_bot.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                if not self.find_mountain_sign(self.img, check_area=True) and self.cycle_count < 1500:
-                    sign_mid_x = self.find_mountain_sign(self.img)
-                    print('pid ing to sign')
-                    if sign_mid_x == -1:
-                        self.drive_robot(0.3, 0)
+                            error = 9 * (self.img_width // 2 - sign_mid_x) / (self.img_width // 2)
+                            self.drive_robot(0.3, self.rot_speed * error)
                     else:
-                        error = 9 * (self.img_width // 2 - sign_mid_x) / (self.img_width // 2)
-                        self.drive_robot(0.3, self.rot_speed * error)
-                else:
-                    print('close to sign, stopping')
-                    self.state = 'clue submission'
-                    self.drive_robot(0, 0)
-                    print('final cycle', self.cycle_count)
-
-            # ----------------- clue submission state -----------------
-            elif self.state == "clue submission":
-                for i in range(my_bot.num_signs):
-                    message = String()
-                    prediction = my_bot.read_sign(my_bot.signs[i])
-                    message.data = "Broda,adorb,"+str(i+1)+","+prediction
-                    self.score_pub.publish(message)
-                end_timer = String()
-                end_timer.data = "Broda,adorb,-1,NA"
-                self.score_pub.publish(end_timer)
-                self.state = 'finished'
-
-            # ----------------- finished state -----------------
-            elif self.state == "finished":
-                self.drive_robot(0, 0)
-                break
+                        print('close to sign, stopping')
+                        self.state = 'clue submission'
+                        self.drive_robot(0, 0)
+                        print('final cycle', self.cycle_count)
+                        print(self.decoder.stats())
+                        print(self.mailbox.stats())
+                        print(self.velocity.stats())
+                        print(self.latency.stats())
+                        for name, detector in (('ped', self.ped_motion), ('truck', self.truck_motion), ('hill', self.hill_motion)):
+                            print(name + ' motion: ' + detector.stats())
+                        print(self.red_tracker.stats())
+                        print(self.magenta_tracker.stats())
+
+                # ----------------- clue submission state -----------------
+                elif self.state == "clue submission":
+                    self.submit_clues()
+                    self.state = 'finished'
+
+                # ----------------- finished state -----------------
+                elif self.state == "finished":
+                    # published before returning, the publisher thread dies with the process
+                    self.latency.decision(self.frame, rospy.get_time())
+                    self.velocity.stop(self.frame)
+                    break
             
 
             if my_bot.sign_img is not None:
@@ -863,9 +948,7 @@ class Driver():
                 current_time = rospy.Time.now()
                 elapsed_time = current_time - my_bot.firstSignTime
                 if elapsed_time > my_bot.durationBetweenSigns:
-                    my_bot.signs.append(my_bot.sign_img)
-                    my_bot.num_signs += 1
-                    my_bot.sign_img = None
+                    my_bot.finish_sign()
         
                 
         # rospy.sleep(0.1)
@@ -873,7 +956,20 @@ class Driver():
 if __name__ == '__main__':
     try:
         my_driver = Driver()
-        my_bot = sign_reader.SignReader()
+        my_bot = sign_reader.SignReader(my_driver.mailbox) # reads frames from the driver's subscription
+        if rospy.get_param('~show_debug', False): # debug windows are off unless asked for
+            visualization.sink.enable()
+        lut_bits = rospy.get_param('~colour_lut_bits', 0) # 0 thresholds with cvtColor + inRange
+        if lut_bits:
+            frame_context.classifier = colour_lut.ColourClassifier(lut_bits)
+            print(f'colour lookup table of {lut_bits} bits built in {frame_context.classifier.build_time:.2f}s')
+        if rospy.get_param('~timing', False): # per state and per detector histograms
+            instrumentation.timing.enable()
+            instrumentation.timing.instrument(my_driver, DETECTORS)
+            instrumentation.timing.instrument(my_bot, SIGN_DETECTORS)
+            instrumentation.timing.start_reporting(rospy.get_param('~timing_period', 5.0),
+                                                   rospy.get_param('~timing_topic', '/broda/timing'),
+                                                   rospy.get_param('~timing_csv', None))
         rospy.sleep(1)
         my_driver.run()
     except rospy.ROSInterruptException:
@@ -0,0 +1,258 @@
+#! /usr/bin/env python3
+
+"""
+Stand-in for the parts of rospy, cv_bridge and the message packages the competition code uses,
+running on a simulated clock so the state machine can be replayed headless.
+
+install() puts the stand-ins in sys.modules, so it has to be called before controller or
+sign_reader are imported.
+"""
+
+import contextlib
+import sys
+import threading
+import types
+
+import numpy as np
+
+
+class ROSInterruptException(Exception):
+    pass
+
+
+# ------------------------- simulated clock -------------------------
+
+class SimClock():
+    """
+    Simulated time in seconds. Only the replay harness moves it forward, and every thread
+    sleeping on it wakes up when it passes their deadline.
+
+    Threads register what they wait for with waiting(), as a condition that holds while they
+    can't go on. The harness only moves time or feeds a frame once is_blocked says the control
+    thread is stuck on such a condition, so it never races a thread still busy with a frame.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.now = 0.0
+        self.shutdown = False
+        self.waiters = {} # thread id -> stack of conditions the thread is blocked on
+
+    def advance_to(self, t):
+        with self.cond:
+            self.now = max(self.now, t)
+            self.cond.notify_all()
+
+    def sleep_until(self, t):
+        with self.waiting(lambda: self.now < t and not self.shutdown):
+            with self.cond:
+                while self.now < t and not self.shutdown:
+                    self.cond.wait(0.1)
+        if self.shutdown:
+            raise ROSInterruptException('ROS shutdown request')
+
+    # marks the calling thread as blocked for as long as blocked() returns True
+    @contextlib.contextmanager
+    def waiting(self, blocked):
+        ident = threading.get_ident()
+        with self.cond:
+            self.waiters.setdefault(ident, []).append(blocked)
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.waiters[ident].pop()
+                if not self.waiters[ident]:
+                    del self.waiters[ident]
+
+    # true if the thread is inside waiting() and its condition still holds, so it can't go on
+    # until the harness moves time or feeds a frame
+    def is_blocked(self, ident):
+        with self.cond:
+            stack = self.waiters.get(ident)
+            return bool(stack) and stack[-1]()
+
+    def stop(self):
+        with self.cond:
+            self.shutdown = True
+            self.cond.notify_all()
+
+
+clock = SimClock()
+params = {} # values returned by get_param, set by the harness
+published = [] # (sim time, topic, message) of every publish
+subscribers = {} # topic -> list of callbacks
+published_lock = threading.Lock()
+
+
+class Duration():
+    def __init__(self, secs=0.0):
+        self.secs = float(secs)
+
+    @classmethod
+    def from_sec(cls, secs):
+        return cls(secs)
+
+    def to_sec(self):
+        return self.secs
+
+    def __lt__(self, other):
+        return self.secs < other.secs
+
+    def __le__(self, other):
+        return self.secs <= other.secs
+
+    def __gt__(self, other):
+        return self.secs > other.secs
+
+    def __ge__(self, other):
+        return self.secs >= other.secs
+
+
+class Time():
+    def __init__(self, secs=0.0):
+        self.secs = float(secs)
+
+    @classmethod
+    def now(cls):
+        return cls(clock.now)
+
+    @classmethod
+    def from_sec(cls, secs):
+        return cls(secs)
+
+    def to_sec(self):
+        return self.secs
+
+    def __sub__(self, other):
+        if isinstance(other, Time):
+            return Duration(self.secs - other.secs)
+        return Time(self.secs - other.secs)
+
+    def __add__(self, other):
+        return Time(self.secs + other.secs)
+
+
+class Rate():
+    def __init__(self, hz):
+        self.period = 1.0 / hz
+        self.last = clock.now
+
+    def sleep(self):
+        deadline = self.last + self.period
+        clock.sleep_until(deadline)
+        # like rospy, don't try to catch up after falling behind
+        self.last = deadline if clock.now - deadline < self.period else clock.now
+
+
+def sleep(secs):
+    if isinstance(secs, Duration):
+        secs = secs.secs
+    clock.sleep_until(clock.now + secs)
+
+
+def get_time():
+    return clock.now
+
+
+def is_shutdown():
+    return clock.shutdown
+
+
+def init_node(name, **kwargs):
+    pass
+
+
+def get_param(name, default=None):
+    return params.get(name, default)
+
+
+class Publisher():
+    def __init__(self, topic, msg_type, queue_size=None, **kwargs):
+        self.topic = topic
+
+    def publish(self, msg):
+        with published_lock:
+            published.append((clock.now, self.topic, msg))
+
+
+class Subscriber():
+    def __init__(self, topic, msg_type, callback, queue_size=None, buff_size=None, **kwargs):
+        subscribers.setdefault(topic, []).append(callback)
+
+
+# ------------------------- messages -------------------------
+
+class Header():
+    def __init__(self):
+        self.seq = 0
+        self.stamp = Time()
+        self.frame_id = ''
+
+
+class Image():
+    def __init__(self):
+        self.header = Header()
+        self.height = 0
+        self.width = 0
+        self.encoding = ''
+        self.is_bigendian = 0
+        self.step = 0
+        self.data = b''
+
+
+class Vector3():
+    def __init__(self):
+        self.x = 0.0
+        self.y = 0.0
+        self.z = 0.0
+
+
+class Twist():
+    def __init__(self):
+        self.linear = Vector3()
+        self.angular = Vector3()
+
+
+class String():
+    def __init__(self, data=''):
+        self.data = data
+
+
+class CvBridge():
+    def imgmsg_to_cv2(self, msg, desired_encoding='passthrough'):
+        channels = msg.step // msg.width
+        img = np.frombuffer(msg.data, dtype=np.uint8).reshape(msg.height, msg.width, channels)
+        if desired_encoding == 'bgr8' and msg.encoding == 'rgb8':
+            img = img[:, :, ::-1]
+        return np.ascontiguousarray(img)
+
+    def cv2_to_imgmsg(self, img, encoding='bgr8'):
+        msg = Image()
+        msg.height, msg.width = img.shape[:2]
+        msg.encoding = encoding
+        msg.step = img.strides[0]
+        msg.data = np.ascontiguousarray(img).tobytes()
+        return msg
+
+
+def install():
+    """
+    Registers the stand-ins as rospy, cv_bridge, sensor_msgs.msg, geometry_msgs.msg and
+    std_msgs.msg.
+    """
+    this = sys.modules[__name__]
+    modules = {
+        'rospy': this,
+        'cv_bridge': types.SimpleNamespace(CvBridge=CvBridge),
+        'sensor_msgs': types.SimpleNamespace(),
+        'sensor_msgs.msg': types.SimpleNamespace(Image=Image),
+        'geometry_msgs': types.SimpleNamespace(),
+        'geometry_msgs.msg': types.SimpleNamespace(Twist=Twist, Vector3=Vector3),
+        'std_msgs': types.SimpleNamespace(),
+        'std_msgs.msg': types.SimpleNamespace(String=String, Header=Header),
+    }
+    for name, module in modules.items():
+        sys.modules[name] = module
+    sys.modules['sensor_msgs'].msg = sys.modules['sensor_msgs.msg']
+    sys.modules['geometry_msgs'].msg = sys.modules['geometry_msgs.msg']
+    sys.modules['std_msgs'].msg = sys.modules['std_msgs.msg']
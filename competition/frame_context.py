@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+
+import cv2
+
+import colour_lut
+
+# ColourClassifier the masks are looked up with, None to threshold with cv2.inRange
+classifier = None
+
+
+class FrameContext():
+    """
+    Holds one camera frame and the colour space conversions detectors need from it.
+
+    Each conversion is computed the first time a detector asks for it and reused by every other
+    detector looking at the same frame, so a frame is converted at most once per colour space.
+    Colour class masks are cached the same way, so treat them as read-only.
+    """
+    def __init__(self, img, seq=0, stamp=None, received=None):
+        self.img = img
+        self.seq = seq # sequence number of the frame from the camera callback
+        self.stamp = stamp # header stamp of the image message in seconds, when the camera took it
+        self.received = received # ROS time in seconds the callback got the frame
+        self.hsv_img = None
+        self.gray_img = None
+        self.hsv_rgb_img = None
+        self.labels_img = None
+        self.masks = {} # colour class name -> mask
+
+    # hsv of the BGR frame
+    @property
+    def hsv(self):
+        if self.hsv_img is None:
+            self.hsv_img = cv2.cvtColor(self.img, cv2.COLOR_BGR2HSV)
+        return self.hsv_img
+
+    @property
+    def gray(self):
+        if self.gray_img is None:
+            self.gray_img = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
+        return self.gray_img
+
+    # hsv of the frame read as RGB, i.e. with red and blue swapped, used by the red line detector
+    @property
+    def hsv_rgb(self):
+        if self.hsv_rgb_img is None:
+            self.hsv_rgb_img = cv2.cvtColor(self.img, cv2.COLOR_RGB2HSV)
+        return self.hsv_rgb_img
+
+    # colour class bitmask of every pixel, from the lookup table classifier
+    @property
+    def labels(self):
+        if self.labels_img is None:
+            self.labels_img = classifier.classify(self.img)
+        return self.labels_img
+
+    def mask(self, name):
+        """
+        Returns the mask of one of the colour classes in colour_lut.COLOUR_CLASSES. With a
+        classifier set it is a bit test on the shared label image, otherwise the class ranges
+        are thresholded on the shared colour conversions.
+
+        Args:
+            name (str): The colour class.
+
+        Returns:
+            numpy.ndarray: uint8 mask, 255 where the pixel is in the class.
+        """
+        mask = self.masks.get(name)
+        if mask is None:
+            if classifier is not None:
+                mask = classifier.mask(self.labels, name)
+            else:
+                mask = colour_lut.class_mask(lambda space: getattr(self, space), colour_lut.COLOUR_CLASSES[name])
+            self.masks[name] = mask
+        return mask
+
+    def region_mask(self, name, x0, y0, x1, y1):
+        """
+        Returns the mask of a colour class over part of the frame. Reuses the full frame mask or
+        conversions when a detector already made them, otherwise only the region is converted.
+        A region covering the whole frame goes through mask, so later detectors reuse it.
+
+        Args:
+            name (str): The colour class.
+            x0, y0, x1, y1 (int): The region, in frame pixels.
+
+        Returns:
+            numpy.ndarray: uint8 mask of the region, 255 where the pixel is in the class.
+        """
+        height, width = self.img.shape[:2]
+        if name in self.masks or (x0, y0, x1, y1) == (0, 0, width, height):
+            return self.mask(name)[y0:y1, x0:x1]
+        if classifier is not None:
+            labels = self.labels_img[y0:y1, x0:x1] if self.labels_img is not None else classifier.classify(self.img[y0:y1, x0:x1])
+            return classifier.mask(labels, name)
+        region = self.img[y0:y1, x0:x1]
+        def colour(space):
+            cached = getattr(self, space + '_img')
+            if cached is not None:
+                return cached[y0:y1, x0:x1]
+            return cv2.cvtColor(region, colour_lut.CONVERSIONS[space])
+        return colour_lut.class_mask(colour, colour_lut.COLOUR_CLASSES[name])
+
+    # gray rows y0 to y1, sliced from the shared gray frame if it exists, otherwise only those 
+    # rows are converted
+    def gray_rows(self, y0, y1):
+        if self.gray_img is not None:
+            return self.gray_img[y0:y1]
+        return cv2.cvtColor(self.img[y0:y1], cv2.COLOR_BGR2GRAY)
+
+    @property
+    def shape(self):
+        return self.img.shape
+
+
+def wrap(img):
+    """
+    Returns a FrameContext for the image, so detectors accept either a raw image or a shared
+    context. A raw image gets a fresh context that only lives for the call.
+
+    Args:
+        img (numpy.ndarray or FrameContext): The image or frame context.
+
+    Returns:
+        FrameContext: The shared context, or a new one wrapping the image.
+    """
+    if isinstance(img, FrameContext):
+        return img
+    return FrameContext(img)
@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+
+import threading
+import weakref
+
+import cv2
+import numpy as np
+from cv_bridge import CvBridge
+
+import frame_context
+
+
+# channels and conversion to bgr8 of the encodings decoded without cv_bridge
+ENCODINGS = {
+    'bgr8': (3, None),
+    'rgb8': (3, cv2.COLOR_RGB2BGR),
+    'bgra8': (4, cv2.COLOR_BGRA2BGR),
+    'rgba8': (4, cv2.COLOR_RGBA2BGR),
+    'mono8': (1, cv2.COLOR_GRAY2BGR),
+}
+
+
+class FrameDecoder():
+    """
+    Turns camera Image messages into bgr8 numpy frames without a fresh allocation per frame.
+
+    bgr8 messages are wrapped as a read-only view of msg.data, no copy at all. Other 8 bit
+    encodings are converted into one of a small pool of preallocated buffers. A pooled buffer
+    is lent to one frame and only goes back to the pool when it is released, which decode_frame
+    does once the FrameContext holding it is dropped, so a frame held by a slow consumer is
+    never overwritten. Anything else falls back to cv_bridge.
+
+    Frames from the view path are read-only: draw on a copy. Don't keep a pooled frame's img
+    past its FrameContext, copy it instead.
+    """
+    def __init__(self, pool_size=3):
+        self.bridge = CvBridge()
+        self.pool_size = pool_size # most free buffers kept for reuse
+        self.free = []
+        self.lent = {} # id -> buffer handed out and not released yet
+        self.lock = threading.Lock() # frames are released from whichever thread drops them last
+
+        self.frames = 0 # frames decoded
+        self.views = 0 # frames wrapped without copying
+        self.allocations = 0 # new frame sized arrays, pool growth and cv_bridge fallbacks
+
+    def decode(self, msg):
+        """
+        Decodes a camera message to a bgr8 image.
+
+        Args:
+            msg (sensor_msgs.msg.Image): The camera message.
+
+        Returns:
+            numpy.ndarray: The bgr8 frame, shaped (height, width, 3).
+        """
+        self.frames += 1
+        if msg.encoding not in ENCODINGS or msg.is_bigendian:
+            self.allocations += 1
+            return self.bridge.imgmsg_to_cv2(msg, 'bgr8')
+
+        channels, conversion = ENCODINGS[msg.encoding]
+        src = np.ndarray((msg.height, msg.width, channels), dtype=np.uint8, buffer=msg.data,
+                         strides=(msg.step, channels, 1))
+        if conversion is None:
+            self.views += 1
+            src.flags.writeable = False
+            return src
+
+        dst = self.lend_buffer(msg.height, msg.width)
+        if channels == 1:
+            src = src[:, :, 0]
+        cv2.cvtColor(src, conversion, dst=dst)
+        return dst
+
+    def decode_frame(self, msg, seq=0, stamp=None, received=None):
+        """
+        Decodes a camera message into a FrameContext that gives its pooled buffer back when it
+        is dropped.
+
+        Args:
+            msg (sensor_msgs.msg.Image): The camera message.
+            seq, stamp, received: Passed on to the FrameContext.
+
+        Returns:
+            FrameContext: The frame.
+        """
+        img = self.decode(msg)
+        frame = frame_context.FrameContext(img, seq, stamp, received)
+        with self.lock:
+            pooled = id(img) in self.lent
+        if pooled:
+            weakref.finalize(frame, self.release, img)
+        return frame
+
+    # returns a free pooled buffer of the frame size, allocating one if none is free
+    def lend_buffer(self, height, width):
+        with self.lock:
+            for i, buf in enumerate(self.free):
+                if buf.shape[:2] == (height, width):
+                    del self.free[i]
+                    self.lent[id(buf)] = buf
+                    return buf
+        buf = np.empty((height, width, 3), dtype=np.uint8)
+        self.allocations += 1
+        with self.lock:
+            self.lent[id(buf)] = buf
+        return buf
+
+    def release(self, img):
+        """
+        Gives a frame from decode back to the pool. Frames that are not pooled buffers are ignored.
+
+        Args:
+            img (numpy.ndarray): The frame, not to be used by the caller afterwards.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            buf = self.lent.pop(id(img), None)
+            if buf is not None and len(self.free) < self.pool_size:
+                self.free.append(buf)
+
+    def stats(self):
+        return (f'{self.frames} frames decoded, {self.views} zero-copy, '
+                f'{self.allocations / max(self.frames, 1):.3f} allocations/frame')
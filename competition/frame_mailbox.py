@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+import threading
+
+
+class FrameMailbox():
+    """
+    Hands the latest camera frame from the subscriber thread to every reader.
+
+    The callback writes into the back slot and swaps it to the front under a lock, so readers
+    always get a complete frame. Only the latest frame is kept: a frame replaced before the
+    control loop took it is counted as dropped.
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.slots = [None, None]
+        self.front = 0
+        self.taken_seq = 0 # sequence number of the last frame handed to the control loop
+
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def put(self, frame):
+        """
+        Publishes a new frame and wakes up anything waiting for one.
+
+        Args:
+            frame (FrameContext): The new frame, its seq must increase with every call.
+
+        Returns:
+            None
+        """
+        with self.cond:
+            self.received += 1
+            stale = self.slots[self.front]
+            if stale is not None and stale.seq > self.taken_seq:
+                self.dropped += 1 # replaced before anyone took it
+            back = 1 - self.front
+            self.slots[back] = frame
+            self.front = back
+            self.slots[1 - back] = None # release the old frame right away
+            self.cond.notify_all()
+
+    # returns the latest frame without waiting, None before the first frame
+    def latest(self):
+        with self.cond:
+            return self.slots[self.front]
+
+    def take(self, last_seq, timeout, should_stop):
+        """
+        Waits for a frame newer than last_seq, for the control loop.
+
+        Args:
+            last_seq (int): The sequence number of the last frame the caller processed.
+            timeout (float): Seconds between should_stop checks while waiting.
+            should_stop (callable): Returns True when the caller should give up waiting.
+
+        Returns:
+            FrameContext or None: The newest frame, None if should_stop returned True first.
+        """
+        with self.cond:
+            while True:
+                frame = self.slots[self.front]
+                if frame is not None and frame.seq > last_seq:
+                    self.taken_seq = frame.seq
+                    self.processed += 1
+                    return frame
+                if should_stop():
+                    return None
+                self.cond.wait(timeout)
+
+    def stats(self):
+        return f'{self.received} frames received, {self.dropped} dropped, {self.processed} processed'
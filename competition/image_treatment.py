@@ -3,6 +3,8 @@
 import cv2
 import numpy as np
 
+import visualization
+
 
 def cropToBlue(img):
     """!
@@ -74,39 +76,21 @@ def cropToWord(img):
     lower_hsv = (5,20,0)
     upper_hsv = (150,255,255)
     hsv_img = cv2.cvtColor(word, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv_img)
-    lim = 0
-    v[v > lim] = 255
-    v[v <= lim] += 255
-    final_hsv = cv2.merge((h, s, v))
-    mask = cv2.inRange(final_hsv, lower_hsv, upper_hsv)
-    contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    # the value channel range covers 0-255, so the mask only depends on hue and saturation
+    mask = cv2.inRange(hsv_img, lower_hsv, upper_hsv)
+    # every contour is used, so skip building the hierarchy
+    contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
     startX = w_
     startY = h_
     endX = 0
     endY = 0
-    for cnt in contours:
-      box = cv2.minAreaRect(cnt)
-      points = cv2.boxPoints(box)
-      for p in points:
-        if p[0] <= startX:
-          startX = p[0]
-        if p[0] >= endX:
-          endX = p[0]
-        if p[1] <= startY:
-          startY = p[1]
-        if p[1] >= endY:
-          endY = p[1]
-      '''
-      if x <= startX:
-        startX = x
-      if w+x >= endX:
-        endX = w+x
-      if y <= startY:
-        startY = y
-      if h+y >= endY:
-        endY = h+y
-        '''    
+    if len(contours) != 0:
+      # word extent is the union of the rotated bounding boxes of every contour
+      points = np.concatenate([cv2.boxPoints(cv2.minAreaRect(cnt)) for cnt in contours])
+      startX = min(startX, points[:, 0].min())
+      endX = max(endX, points[:, 0].max())
+      startY = min(startY, points[:, 1].min())
+      endY = max(endY, points[:, 1].max())
     cropped = word[int(round(startY)):int(round(endY)), int(round(startX)):int(round(endX))]
     h, w = cropped.shape[:2]
     ratio = w/h
@@ -124,8 +108,7 @@ def wordToLetters(word):
 
     @return     letters: cropped and scaled images of letters
     """
-  cv2.imshow("word", word)
-  cv2.waitKey(1)
+  visualization.sink.show("word", word)
   letters = []
   h_, w_ = word.shape[:2]
   gray = cv2.cvtColor(word, cv2.COLOR_BGR2GRAY)
@@ -135,8 +118,7 @@ def wordToLetters(word):
   kernel = np.ones((5, 5), np.uint8)
   dilation = cv2.dilate(thresh1, rect_kernel, iterations = 1)
   erosion = cv2.erode(dilation, kernel, iterations = 1)
-  cv2.imshow("mask", erosion)
-  cv2.waitKey(1)
+  visualization.sink.show("mask", erosion)
   contours, _ = cv2.findContours(erosion, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
   threshArea = 500
   possibleLetters = []
@@ -212,8 +194,8 @@ def signToLetters(sign):
   words = cropToWord(sign)
   category = wordToLetters(words[0])
   clue = wordToLetters(words[1])
-  cv2.imshow("clue", np.concatenate(clue, axis=0))
-  cv2.waitKey(1)
+  if visualization.sink.enabled and len(clue) != 0:
+    visualization.sink.show("clue", np.concatenate(clue, axis=0))
   return np.array(clue)
 '''
   rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+
+import bisect
+import functools
+import threading
+import time
+
+import rospy
+from std_msgs.msg import String
+
+
+# upper edges of the histogram buckets in microseconds, 8 per decade from 1us to 10s
+BUCKET_EDGES_US = [10 ** (i / 8) for i in range(57)]
+
+CSV_HEADER = 'kind,name,count,total_ms,mean_us,p50_us,p95_us,p99_us,max_us'
+
+
+class Histogram():
+    """
+    Fixed size log scale histogram of durations. Recording is a bisect and two additions, and
+    memory doesn't grow however long the robot runs. Percentiles are the upper edge of the
+    bucket they fall in, so they are accurate to about 30%.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_EDGES_US) + 1) # the last bucket catches anything over 10s
+        self.count = 0
+        self.total = 0.0 # seconds
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        self.counts[bisect.bisect_left(BUCKET_EDGES_US, us)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # duration in microseconds below which a fraction q of the recorded durations are
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(BUCKET_EDGES_US[i], self.max * 1e6) if i < len(BUCKET_EDGES_US) else self.max * 1e6
+        return self.max * 1e6
+
+    def row(self):
+        mean_us = 1e6 * self.total / max(self.count, 1)
+        return (f'{self.count},{1000 * self.total:.3f},{mean_us:.1f},{self.percentile(0.5):.1f},'
+                f'{self.percentile(0.95):.1f},{self.percentile(0.99):.1f},{1e6 * self.max:.1f}')
+
+
+class NullProbe():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PROBE = NullProbe()
+
+
+class Probe():
+    def __init__(self, timing, kind, name):
+        self.timing = timing
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timing.record(self.kind, self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation():
+    """
+    Times detectors and state machine branches into one histogram per (kind, name).
+
+    Off by default. While off, probe returns a shared do-nothing context manager, so the control
+    loop's state timing costs a flag check. Detectors are only wrapped by instrument, which
+    is meant to be called once timing is turned on, so they cost nothing when it is off.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.report_thread = None
+
+    def enable(self):
+        self.enabled = True
+
+    def record(self, kind, name, seconds):
+        """
+        Adds one duration to the histogram of kind and name.
+
+        Args:
+            kind (str): What is being timed, 'state' or 'detector'.
+            name (str): The state or detector name.
+            seconds (float): The duration.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            histogram = self.histograms.get((kind, name))
+            if histogram is None:
+                histogram = self.histograms[(kind, name)] = Histogram()
+            histogram.record(seconds)
+
+    # context manager timing its body, does nothing while timing is off
+    def probe(self, kind, name):
+        if not self.enabled:
+            return NULL_PROBE
+        return Probe(self, kind, name)
+
+    # decorator timing every call while timing is on
+    def timed(self, kind, name=None):
+        def decorator(fn):
+            label = name or fn.__name__
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(kind, label, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def instrument(self, obj, names, kind='detector'):
+        """
+        Replaces methods of one object with timed versions. Only that object is affected, and
+        nothing is wrapped until this is called.
+
+        Args:
+            obj (object): The object whose methods are timed, e.g. the Driver.
+            names (iterable): The method names.
+            kind (str): The histogram kind the calls are recorded under.
+
+        Returns:
+            None
+        """
+        for name in names:
+            setattr(obj, name, self.timed(kind, name)(getattr(obj, name)))
+
+    def rows(self):
+        with self.lock:
+            return [f'{kind},{name},{histogram.row()}'
+                    for (kind, name), histogram in sorted(self.histograms.items())]
+
+    def dump_csv(self, path):
+        with open(path, 'w') as f:
+            f.write('\n'.join([CSV_HEADER] + self.rows()) + '\n')
+
+    def start_reporting(self, period=5.0, topic=None, csv_path=None):
+        """
+        Publishes the histograms as csv text on a topic and/or rewrites a csv file every period
+        seconds, from a background thread.
+
+        Args:
+            period (float): Seconds between reports.
+            topic (str): The topic to publish std_msgs/String reports on, None to not publish.
+            csv_path (str): The file to rewrite with each report, None to not write one.
+
+        Returns:
+            None
+        """
+        if self.report_thread is not None:
+            return
+        publisher = rospy.Publisher(topic, String, queue_size=1) if topic else None
+        self.report_thread = threading.Thread(target=self.report, args=(period, publisher, csv_path),
+                                              name='instrumentation', daemon=True)
+        self.report_thread.start()
+
+    def report(self, period, publisher, csv_path):
+        while not rospy.is_shutdown():
+            try:
+                rospy.sleep(period)
+            except rospy.ROSInterruptException:
+                break
+            if publisher is not None:
+                publisher.publish(String(data='\n'.join([CSV_HEADER] + self.rows())))
+            if csv_path is not None:
+                self.dump_csv(csv_path)
+
+
+timing = Instrumentation()
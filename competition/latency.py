@@ -0,0 +1,101 @@
+#! /usr/bin/env python3
+
+import collections
+import threading
+
+
+class LatencyTracker():
+    """
+    Follows camera frames from the camera to cmd_vel.
+
+    Every frame carries the header stamp of its image and the time the callback received it.
+    For each command published, the tracker records the age of the frame it was decided on
+    (publish time minus the header stamp, i.e. glass to actuator). For each frame the control
+    loop acted on, it records the processing latency (decision time minus receive time). Stats
+    cover the last window_size samples, and commands from frames older than stale_age are
+    counted. Keepalive repeats of an unchanged command are left out, their frame is old by
+    design. All times are ROS time in seconds, so they follow the simulation clock.
+    """
+    def __init__(self, window_size=300, stale_age=0.25):
+        self.stale_age = stale_age
+        self.lock = threading.Lock()
+        self.frame_ages = collections.deque(maxlen=window_size) # age of the frame of each command
+        self.processing = collections.deque(maxlen=window_size) # receive to decision of each frame
+        self.decision_times = collections.deque(maxlen=window_size) # for the control rate
+        self.last_decision_seq = -1
+
+        self.commands = 0
+        self.stale_commands = 0
+        self.untagged_commands = 0 # published before any frame was decided on
+        self.keepalives = 0 # repeats of an unchanged command, not counted as commands
+
+    def decision(self, frame, now):
+        """
+        Records the control loop acting on a frame. Only the first decision on each frame
+        counts, a loop sending several commands from one frame is one control step.
+
+        Args:
+            frame (FrameContext): The frame the command was decided on.
+            now (float): The current ROS time in seconds.
+
+        Returns:
+            None
+        """
+        if frame is None or frame.received is None:
+            return
+        with self.lock:
+            if frame.seq == self.last_decision_seq:
+                return
+            self.last_decision_seq = frame.seq
+            self.processing.append(now - frame.received)
+            self.decision_times.append(now)
+
+    def command(self, frame, now, keepalive=False):
+        """
+        Records a command going out on cmd_vel.
+
+        Args:
+            frame (FrameContext): The frame the command was decided on, None if there was none.
+            now (float): The ROS time the command was published at.
+            keepalive (bool): True if the command repeats the last one because nothing changed.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if keepalive:
+                self.keepalives += 1
+                return
+            self.commands += 1
+            if frame is None or frame.stamp is None:
+                self.untagged_commands += 1
+                return
+            age = now - frame.stamp
+            self.frame_ages.append(age)
+            if age > self.stale_age:
+                self.stale_commands += 1
+
+    # decisions per second over the window
+    def control_rate(self):
+        with self.lock:
+            if len(self.decision_times) < 2:
+                return 0.0
+            span = self.decision_times[-1] - self.decision_times[0]
+            return (len(self.decision_times) - 1) / span if span > 0 else 0.0
+
+    def summary(self, samples):
+        if not samples:
+            return 'n/a'
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return (f'mean {1000 * sum(ordered) / len(ordered):.1f} ms, p95 {1000 * p95:.1f} ms, '
+                f'max {1000 * ordered[-1]:.1f} ms')
+
+    def stats(self):
+        rate = self.control_rate()
+        with self.lock:
+            ages = list(self.frame_ages)
+            processing = list(self.processing)
+        return (f'frame age at cmd_vel: {self.summary(ages)}; processing: {self.summary(processing)}; '
+                f'control rate {rate:.1f} Hz; {self.stale_commands}/{self.commands} commands from frames '
+                f'older than {1000 * self.stale_age:.0f} ms, {self.keepalives} keepalives not counted')
@@ -0,0 +1,247 @@
+#! /usr/bin/env python3
+
+import argparse
+import json
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class LetterBackend():
+    """
+    Interface for the letter classifier used by SignReader.
+
+    A backend takes a batch of letter crops shaped (N, 90, 60, 1) and returns the class
+    probabilities shaped (N, 36), one row per crop.
+    """
+    def predict(self, letters):
+        raise NotImplementedError
+
+
+class KerasBackend(LetterBackend):
+    """
+    Runs the letter classifier through the full Keras SavedModel. TensorFlow is only imported
+    here, so nothing pays for it unless this backend is used.
+    """
+    def __init__(self, path):
+        start_time = time.perf_counter()
+        from tensorflow.python.keras.models import load_model
+        self.import_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        self.model = load_model(path)
+        self.load_time = time.perf_counter() - start_time
+
+    def predict(self, letters):
+        return self.model.predict(letters, batch_size=letters.shape[0])
+
+
+class NumpyBackend(LetterBackend):
+    """
+    Runs the letter classifier as a pure NumPy forward pass over weights exported with
+    export_weights. Quantized weights are expanded back to float32 once at load time.
+    """
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            spec = json.loads(str(data['spec']))
+            self.layers = []
+            for i, layer in enumerate(spec):
+                weights = [dequantize(data, 'w' + str(i) + '_' + str(j), layer['dtype'])
+                           for j in range(layer['num_weights'])]
+                self.layers.append((layer['kind'], layer['config'], weights))
+
+    def predict(self, letters):
+        x = letters.astype(np.float32)
+        for kind, config, weights in self.layers:
+            x = LAYERS[kind](x, config, weights)
+        return x
+
+
+def load_backend(kind, path):
+    """
+    Loads a letter classifier backend.
+
+    Args:
+        kind (str): 'keras' for a SavedModel directory or 'numpy' for an exported weight file.
+        path (str): The path of the model to load.
+
+    Returns:
+        LetterBackend: The loaded backend.
+    """
+    if kind == 'keras':
+        return KerasBackend(path)
+    elif kind == 'numpy':
+        return NumpyBackend(path)
+    raise ValueError('unknown letter backend: ' + str(kind))
+
+
+# ------------------------- weight export -------------------------
+
+def export_weights(model, path, dtype='float32'):
+    """
+    Exports the layers of a Keras model to a compact .npz file for NumpyBackend.
+
+    Args:
+        model (keras.Model): The sequential letter classifier.
+        path (str): The file to write.
+        dtype (str): 'float32', 'float16' or 'int8', the storage format of the kernels.
+                     int8 uses symmetric per-output-channel scales.
+    """
+    spec = []
+    arrays = {}
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ('InputLayer', 'Dropout'):
+            continue
+        if kind not in LAYERS:
+            raise ValueError('layer type not supported by NumpyBackend: ' + kind)
+        config = layer.get_config()
+        if config.get('data_format', 'channels_last') != 'channels_last':
+            raise ValueError('only channels_last layers are supported')
+        weights = layer.get_weights()
+        i = len(spec)
+        spec.append({'kind': kind,
+                     'config': {key: config[key] for key in LAYER_CONFIG_KEYS[kind]},
+                     'num_weights': len(weights),
+                     'dtype': dtype})
+        for j, w in enumerate(weights):
+            quantize(arrays, 'w' + str(i) + '_' + str(j), np.asarray(w, dtype=np.float32), dtype)
+    np.savez_compressed(path, spec=np.array(json.dumps(spec)), **arrays)
+
+
+def quantize(arrays, key, w, dtype):
+    # biases and other vectors are small, only kernels are quantized
+    if w.ndim < 2 or dtype == 'float32':
+        arrays[key] = w
+    elif dtype == 'float16':
+        arrays[key] = w.astype(np.float16)
+    elif dtype == 'int8':
+        reduce_axes = tuple(range(w.ndim - 1))
+        scale = np.abs(w).max(axis=reduce_axes) / 127.0
+        scale[scale == 0] = 1.0
+        arrays[key] = np.round(w / scale).astype(np.int8)
+        arrays[key + '_scale'] = scale.astype(np.float32)
+    else:
+        raise ValueError('unknown weight dtype: ' + str(dtype))
+
+
+def dequantize(data, key, dtype):
+    w = data[key]
+    if w.dtype == np.int8:
+        return w.astype(np.float32) * data[key + '_scale']
+    return w.astype(np.float32)
+
+
+# ------------------------- layer kernels -------------------------
+
+def activation(x, name):
+    if name == 'linear':
+        return x
+    elif name == 'relu':
+        return np.maximum(x, 0)
+    elif name == 'sigmoid':
+        return 1 / (1 + np.exp(-x))
+    elif name == 'tanh':
+        return np.tanh(x)
+    elif name == 'softmax':
+        e = np.exp(x - x.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    raise ValueError('activation not supported by NumpyBackend: ' + str(name))
+
+
+# pads the spatial axes of an NHWC batch the way TensorFlow does for 'same' padding
+def pad_same(x, size, strides, value=0.0):
+    pads = [(0, 0)]
+    for axis in range(2):
+        length = x.shape[axis + 1]
+        out = -(-length // strides[axis])
+        total = max((out - 1) * strides[axis] + size[axis] - length, 0)
+        pads.append((total // 2, total - total // 2))
+    pads.append((0, 0))
+    return np.pad(x, pads, constant_values=value)
+
+
+def windows(x, size, strides, padding, pad_value=0.0):
+    if padding == 'same':
+        x = pad_same(x, size, strides, pad_value)
+    view = sliding_window_view(x, size, axis=(1, 2)) # N, H', W', C, kh, kw
+    return view[:, ::strides[0], ::strides[1]]
+
+
+def conv2d(x, config, weights):
+    kernel = weights[0]
+    view = windows(x, kernel.shape[:2], config['strides'], config['padding'])
+    y = np.tensordot(view, kernel, axes=([3, 4, 5], [2, 0, 1]))
+    if config['use_bias']:
+        y += weights[1]
+    return activation(y, config['activation'])
+
+
+def max_pooling2d(x, config, weights):
+    size = config['pool_size']
+    strides = config['strides'] or size
+    if config['padding'] == 'valid' and tuple(size) == tuple(strides):
+        # non-overlapping pools reduce to a reshape
+        n, h, w, c = x.shape
+        h -= h % size[0]
+        w -= w % size[1]
+        x = x[:, :h, :w].reshape(n, h // size[0], size[0], w // size[1], size[1], c)
+        return x.max(axis=(2, 4))
+    return windows(x, size, strides, config['padding'], -np.inf).max(axis=(4, 5))
+
+
+def average_pooling2d(x, config, weights):
+    size = config['pool_size']
+    strides = config['strides'] or size
+    return windows(x, size, strides, config['padding']).mean(axis=(4, 5))
+
+
+def dense(x, config, weights):
+    y = x @ weights[0]
+    if config['use_bias']:
+        y += weights[1]
+    return activation(y, config['activation'])
+
+
+def batch_normalization(x, config, weights):
+    weights = list(weights)
+    gamma = weights.pop(0) if config['scale'] else 1.0
+    beta = weights.pop(0) if config['center'] else 0.0
+    mean, var = weights
+    scale = gamma / np.sqrt(var + config['epsilon'])
+    return x * scale + (beta - mean * scale)
+
+
+LAYERS = {
+    'Conv2D': conv2d,
+    'MaxPooling2D': max_pooling2d,
+    'AveragePooling2D': average_pooling2d,
+    'Flatten': lambda x, config, weights: x.reshape(x.shape[0], -1),
+    'Dense': dense,
+    'Activation': lambda x, config, weights: activation(x, config['activation']),
+    'ReLU': lambda x, config, weights: np.maximum(x, 0),
+    'Rescaling': lambda x, config, weights: x * config['scale'] + config['offset'],
+    'BatchNormalization': batch_normalization,
+}
+
+LAYER_CONFIG_KEYS = {
+    'Conv2D': ('strides', 'padding', 'activation', 'use_bias'),
+    'MaxPooling2D': ('pool_size', 'strides', 'padding'),
+    'AveragePooling2D': ('pool_size', 'strides', 'padding'),
+    'Flatten': (),
+    'Dense': ('activation', 'use_bias'),
+    'Activation': ('activation',),
+    'ReLU': (),
+    'Rescaling': ('scale', 'offset'),
+    'BatchNormalization': ('epsilon', 'center', 'scale'),
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='export the Keras letter model for NumpyBackend')
+    parser.add_argument('model', help='Keras SavedModel directory')
+    parser.add_argument('output', help='.npz file to write')
+    parser.add_argument('--dtype', default='float32', choices=('float32', 'float16', 'int8'))
+    args = parser.parse_args()
+    export_weights(KerasBackend(args.model).model, args.output, args.dtype)
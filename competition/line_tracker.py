@@ -0,0 +1,131 @@
+#! /usr/bin/env python3
+
+import weakref
+
+import cv2
+import numpy as np
+
+import blobs
+
+
+class TrackedLine():
+    """
+    The largest blob of a line colour in one frame, with the geometry the detectors read.
+    """
+    def __init__(self, contour, area, box):
+        self.contour = contour
+        self.area = area
+        self.box = box # x, y, w, h of the upright bounding box
+        self.rect = cv2.minAreaRect(contour)
+
+    @property
+    def angle(self):
+        return self.rect[2]
+
+    # centre y of the rotated rectangle
+    @property
+    def y(self):
+        return self.rect[0][1]
+
+    # centre x of the upright bounding box
+    @property
+    def mid_x(self):
+        return self.box[0] + self.box[2] // 2
+
+
+def largest_line(mask, offset=(0, 0)):
+    """
+    Finds the largest blob of a line mask.
+
+    Args:
+        mask (numpy.ndarray): The colour class mask.
+        offset (tuple): Position of the mask in the frame, added to the contour coordinates.
+
+    Returns:
+        TrackedLine or None: The largest blob, None if the mask is empty.
+    """
+    found = blobs.Blobs(mask, offset=offset)
+    if len(found) == 0:
+        return None
+    largest = found.largest()
+    return TrackedLine(found.contours[largest], found.areas[largest], found.box(largest))
+
+
+class LineTracker():
+    """
+    Follows the largest blob of one line colour (the red crosswalk line or the magenta lines)
+    from frame to frame.
+
+    While the line is tracked, only a window around its last rotated rectangle, grown by pad
+    pixels on every side, is thresholded and searched. The whole frame is searched instead when
+    nothing is found there, when the blob found reaches the edge of the window so it may extend
+    past it, when it is smaller than min_area, or when the last full search is refresh_period
+    frames old. A speck below the caller's threshold therefore never holds the track, and a
+    larger line appearing elsewhere in the frame is found within refresh_period frames. Asking
+    again about the same frame returns the cached result.
+    """
+    def __init__(self, colour, min_area, pad=40, refresh_period=10):
+        self.colour = colour # colour class in colour_lut.COLOUR_CLASSES
+        self.min_area = min_area # smallest blob the detectors count as the line
+        self.pad = pad
+        self.refresh_period = refresh_period # most frames between full frame searches
+        self.line = None
+        self.frame_ref = None # weak reference, so the tracker doesn't keep frame buffers alive
+        self.since_full_search = 0
+
+        self.window_searches = 0
+        self.full_searches = 0
+
+    def reset(self):
+        self.line = None
+        self.frame_ref = None
+        self.since_full_search = 0
+
+    def update(self, frame):
+        """
+        Finds the line in a frame.
+
+        Args:
+            frame (FrameContext): The camera frame.
+
+        Returns:
+            TrackedLine or None: The line, None if there is none of the colour in the frame.
+        """
+        if self.frame_ref is not None and self.frame_ref() is frame:
+            return self.line
+        line = None
+        if self.line is not None and self.since_full_search + 1 < self.refresh_period:
+            line = self.search_window(frame)
+        if line is None or line.area < self.min_area:
+            line = largest_line(frame.mask(self.colour))
+            self.full_searches += 1
+            self.since_full_search = 0
+        else:
+            self.window_searches += 1
+            self.since_full_search += 1
+        self.line = line
+        self.frame_ref = weakref.ref(frame)
+        return line
+
+    def search_window(self, frame):
+        height, width = frame.shape[:2]
+        x, y, w, h = cv2.boundingRect(cv2.boxPoints(self.line.rect))
+        x0, y0 = max(0, x - self.pad), max(0, y - self.pad)
+        x1, y1 = min(width, x + w + self.pad), min(height, y + h + self.pad)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        mask = np.ascontiguousarray(frame.region_mask(self.colour, x0, y0, x1, y1))
+        line = largest_line(mask, offset=(x0, y0))
+        if line is None:
+            return None
+        bx, by, bw, bh = line.box
+        # a blob touching a window edge inside the frame may be cut off, look at the whole frame
+        if (bx <= x0 and x0 > 0) or (bx + bw >= x1 and x1 < width) \
+                or (by <= y0 and y0 > 0) or (by + bh >= y1 and y1 < height):
+            return None
+        return line
+
+    def stats(self):
+        searches = max(self.window_searches + self.full_searches, 1)
+        return (f'{self.colour} tracker: {self.window_searches} window searches, {self.full_searches} full '
+                f'frame ({100 * self.window_searches / searches:.0f}% tracked)')
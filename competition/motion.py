@@ -0,0 +1,102 @@
+#! /usr/bin/env python3
+
+import time
+
+import cv2
+import numpy as np
+
+
+MODES = ('mog2', 'diff', 'running_avg')
+
+
+class MotionDetector():
+    """
+    Foreground mask of one detector's region of interest, with a background model of its own.
+
+    The region is converted to gray and shrunk by scale before the model sees it, so a model
+    only ever sees one image size and each detector pays for a fraction of the pixels. Modes:
+
+        mog2         per pixel gaussian mixture, the most robust and most expensive
+        diff         difference with the previous frame, catches moving edges only
+        running_avg  difference with a running average background of fixed learning rate
+
+    Masks are at the reduced size: scale contour coordinates and areas back with to_full and
+    area_to_full before comparing them to full resolution thresholds.
+    """
+    def __init__(self, mode='mog2', scale=0.5, roi=None, threshold=25, learning_rate=0.05):
+        if mode not in MODES:
+            raise ValueError('unknown motion mode ' + mode + ', expected one of ' + ', '.join(MODES))
+        self.mode = mode
+        self.scale = scale
+        self.roi = roi # (x0, y0, x1, y1) in full frame pixels, None for the whole frame
+        self.threshold = threshold # gray level change counted as motion by diff and running_avg
+        self.learning_rate = learning_rate # weight of each new frame in the running_avg background
+
+        self.model = cv2.createBackgroundSubtractorMOG2() if mode == 'mog2' else None
+        self.previous = None # last gray frame for diff, float background for running_avg
+
+        self.calls = 0
+        self.total_time = 0.0
+
+    def reset(self):
+        if self.mode == 'mog2':
+            self.model = cv2.createBackgroundSubtractorMOG2()
+        self.previous = None
+
+    def prepare(self, frame):
+        if self.roi is None:
+            gray = frame.gray
+        else:
+            x0, y0, x1, y1 = self.roi
+            gray = frame.gray_rows(y0, y1)[:, x0:x1]
+        if self.scale != 1:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def apply(self, frame):
+        """
+        Updates the background model with a frame and returns what moved.
+
+        Args:
+            frame (FrameContext): The camera frame, only its gray region of interest is used.
+
+        Returns:
+            numpy.ndarray: uint8 mask at the reduced size, non-zero where motion was found.
+        """
+        start_time = time.perf_counter()
+        gray = self.prepare(frame)
+        if self.previous is not None and self.previous.shape != gray.shape:
+            self.reset() # a new frame size, the old background means nothing
+
+        if self.mode == 'mog2':
+            mask = self.model.apply(gray)
+        elif self.mode == 'diff':
+            if self.previous is None:
+                mask = np.zeros_like(gray)
+            else:
+                mask = cv2.threshold(cv2.absdiff(gray, self.previous), self.threshold, 255, cv2.THRESH_BINARY)[1]
+            self.previous = gray.copy() # the gray frame may be a view of a shared buffer
+        else:
+            if self.previous is None:
+                self.previous = gray.astype(np.float32)
+            background = cv2.convertScaleAbs(self.previous)
+            mask = cv2.threshold(cv2.absdiff(gray, background), self.threshold, 255, cv2.THRESH_BINARY)[1]
+            cv2.accumulateWeighted(gray, self.previous, self.learning_rate)
+
+        self.calls += 1
+        self.total_time += time.perf_counter() - start_time
+        return mask
+
+    # full resolution coordinate of a mask coordinate, relative to the region of interest
+    def to_full(self, value):
+        return int(value / self.scale)
+
+    # full resolution area of a mask area
+    def area_to_full(self, area):
+        return area / (self.scale * self.scale)
+
+    def cost(self):
+        return 1000 * self.total_time / max(self.calls, 1)
+
+    def stats(self):
+        return f'{self.mode} at {self.scale:g}x: {self.calls} calls, {self.cost():.3f} ms/call'
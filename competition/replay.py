@@ -0,0 +1,263 @@
+#! /usr/bin/env python3
+
+"""
+Replays recorded camera frames through the driver without ROS or Gazebo.
+
+The frames are fed to the camera subscribers on a simulated clock that only moves when the
+next frame is due, so a run takes as long as the processing does instead of the recording.
+Feeding is lock-step: the clock only moves, the velocity publisher only ticks and a frame is
+only fed once the control loop is blocked waiting for one of them, so the same frames give the
+same commands on every run. Every cmd_vel and /score_tracker message is recorded with its
+simulated time.
+
+    python3 replay.py frames_dir --fps 30 --out replay.json
+    python3 replay.py run.npz --backend numpy --weights my_model05.npz
+
+Sources are a directory of images (played in name order), a .zip or .tar of images, or an .npz
+with a 'frames' array of bgr8 frames and an optional 'stamps' array of seconds.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+
+import cv2
+import numpy as np
+
+import fake_rospy
+
+
+CAMERA_TOPIC = '/R1/pi_camera/image_raw'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def image_names(names):
+    return sorted(name for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def decode_image(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def read_frames(path, fps=30.0):
+    """
+    Yields the frames of a recording in order.
+
+    Args:
+        path (str): A directory of images, a .zip or .tar of images, or an .npz of frames.
+        fps (float): Frame rate used to time stamp sources without stamps.
+
+    Returns:
+        generator: (stamp in seconds, bgr8 numpy.ndarray) pairs.
+    """
+    if os.path.isdir(path):
+        for i, name in enumerate(image_names(os.listdir(path))):
+            yield i / fps, cv2.imread(os.path.join(path, name))
+    elif path.endswith('.npz'):
+        data = np.load(path)
+        frames = data['frames']
+        stamps = data['stamps'] if 'stamps' in data else np.arange(len(frames)) / fps
+        for stamp, frame in zip(stamps, frames):
+            yield float(stamp), frame
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for i, name in enumerate(image_names(archive.namelist())):
+                yield i / fps, decode_image(archive.read(name))
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            members = {member.name: member for member in archive.getmembers() if member.isfile()}
+            for i, name in enumerate(image_names(members)):
+                yield i / fps, decode_image(archive.extractfile(members[name]).read())
+    else:
+        raise ValueError('unsupported frame source: ' + path)
+
+
+def to_message(img, seq, stamp):
+    msg = fake_rospy.CvBridge().cv2_to_imgmsg(img, 'bgr8')
+    msg.header.seq = seq
+    msg.header.stamp = fake_rospy.Time(stamp)
+    return msg
+
+
+def message_record(stamp, topic, msg):
+    if hasattr(msg, 'linear'):
+        return {'t': stamp, 'topic': topic, 'linear': msg.linear.x, 'angular': msg.angular.z}
+    return {'t': stamp, 'topic': topic, 'data': msg.data}
+
+
+class Replay():
+    """
+    Drives a Driver and SignReader with recorded frames on the fake rospy clock.
+
+    The harness owns every source of progress: it feeds the frames, moves the clock and ticks
+    the velocity publisher, which runs without a thread of its own. Each of those only happens
+    once the control loop is blocked, waiting in mailbox.take for a frame not fed yet, asleep
+    on the clock, or waiting for a ramp to finish, so the state machine always reads the same
+    time and sees the same commands on every run.
+
+    fake_rospy has to be installed before controller is imported, so the constructor does both.
+    """
+    def __init__(self, params=None, stall_timeout=5.0):
+        fake_rospy.install()
+        fake_rospy.params.update(params or {})
+        fake_rospy.params['~velocity_thread'] = False
+        import controller
+        import sign_reader
+
+        self.stall_timeout = stall_timeout # wall seconds to wait on the control loop before moving on
+        self.driver = controller.Driver()
+        controller.my_bot = sign_reader.SignReader(self.driver.mailbox) # run() uses the module global
+        self.reader = controller.my_bot
+        self.velocity = self.driver.velocity
+        self.tick_period = 1.0 / self.velocity.rate
+        self.next_tick = 0.0
+
+        # tell the clock what the control loop is blocked on while it waits for a frame or a ramp
+        mailbox = self.driver.mailbox
+        take = mailbox.take
+        def take_on_clock(last_seq, timeout, should_stop):
+            with fake_rospy.clock.waiting(lambda: last_seq >= self.frames):
+                return take(last_seq, timeout, should_stop)
+        mailbox.take = take_on_clock
+        wait = self.velocity.wait
+        def wait_on_clock():
+            with fake_rospy.clock.waiting(lambda: self.velocity.ramping):
+                return wait()
+        self.velocity.wait = wait_on_clock
+
+        self.frames = 0
+        self.stalls = 0 # times the control loop didn't block within stall_timeout, these make a run nondeterministic
+        self.error = None
+        self.control = threading.Thread(target=self.control_loop, name='control', daemon=True)
+
+    def control_loop(self):
+        try:
+            self.driver.run()
+        except fake_rospy.ROSInterruptException:
+            pass
+        except Exception as e:
+            self.error = e
+            raise
+
+    # blocks until the control loop can't go on without the harness, or has exited
+    def wait_until_blocked(self):
+        deadline = time.perf_counter() + self.stall_timeout
+        while self.control.is_alive():
+            if fake_rospy.clock.is_blocked(self.control.ident):
+                return
+            if time.perf_counter() > deadline:
+                self.stalls += 1
+                return
+            time.sleep(0.0002)
+
+    # moves the clock to t one step at a time, ticking the velocity publisher on the way
+    def advance_to(self, t):
+        while self.next_tick <= t:
+            fake_rospy.clock.advance_to(self.next_tick)
+            self.wait_until_blocked()
+            self.velocity.tick()
+            self.wait_until_blocked()
+            self.next_tick += self.tick_period
+        fake_rospy.clock.advance_to(t)
+        self.wait_until_blocked()
+
+    def run(self, frames):
+        """
+        Feeds every frame, then shuts the fake ROS down and waits for the control loop.
+
+        Args:
+            frames (iterable): (stamp in seconds, bgr8 numpy.ndarray) pairs.
+
+        Returns:
+            dict: Summary of the run and every recorded message.
+        """
+        start_time = time.perf_counter()
+        start_stamp = None
+        # a read waiting on the model isn't blocked on anything the harness controls
+        self.reader.model_ready.wait()
+        self.control.start()
+        self.wait_until_blocked()
+        for stamp, img in frames:
+            if not self.control.is_alive():
+                break
+            if start_stamp is None:
+                start_stamp = stamp
+            stamp -= start_stamp
+            self.advance_to(stamp)
+            self.frames += 1
+            msg = to_message(img, self.frames, stamp)
+            for callback in fake_rospy.subscribers.get(CAMERA_TOPIC, []):
+                callback(msg)
+            self.wait_until_blocked()
+        fake_rospy.clock.stop()
+        self.control.join(self.stall_timeout)
+        wall_time = time.perf_counter() - start_time
+
+        sim_time = fake_rospy.clock.now
+        with fake_rospy.published_lock:
+            messages = [message_record(*published) for published in fake_rospy.published]
+        return {
+            'frames': self.frames,
+            'sim_time': sim_time,
+            'wall_time': wall_time,
+            'speedup': sim_time / wall_time if wall_time else 0.0,
+            'stalls': self.stalls,
+            'final_state': self.driver.state,
+            'error': None if self.error is None else repr(self.error),
+            'decoder': self.driver.decoder.stats(),
+            'mailbox': self.driver.mailbox.stats(),
+            'velocity': self.driver.velocity.stats(),
+            'latency': self.driver.latency.stats(),
+            'cmd_vel': [m for m in messages if m['topic'] == '/R1/cmd_vel'],
+            'score_tracker': [m for m in messages if m['topic'] == '/score_tracker'],
+        }
+
+
+def ignore_shutdown(args):
+    # background threads sleeping on the clock are woken up by ROSInterruptException at the end
+    if not issubclass(args.exc_type, fake_rospy.ROSInterruptException):
+        sys.__excepthook__(args.exc_type, args.exc_value, args.exc_traceback)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='replay recorded camera frames through the driver')
+    parser.add_argument('source', help='image directory, .zip/.tar of images or .npz of frames')
+    parser.add_argument('--fps', type=float, default=30.0, help='frame rate of sources without stamps')
+    parser.add_argument('--backend', default='keras', choices=['keras', 'numpy'])
+    parser.add_argument('--model', help='SavedModel directory for the keras backend')
+    parser.add_argument('--weights', help='exported .npz weights for the numpy backend')
+    parser.add_argument('--stall-timeout', type=float, default=5.0,
+                        help='wall seconds to wait for the control loop before feeding the next frame')
+    parser.add_argument('--out', help='write the summary and recorded messages to this json file')
+    args = parser.parse_args()
+
+    params = {'~letter_backend': args.backend}
+    if args.model:
+        params['~model_path'] = args.model
+    if args.weights:
+        params['~weights_path'] = args.weights
+
+    threading.excepthook = ignore_shutdown
+    replay = Replay(params, args.stall_timeout)
+    result = replay.run(read_frames(args.source, args.fps))
+
+    print(f"{result['frames']} frames, {result['sim_time']:.1f}s simulated in "
+          f"{result['wall_time']:.1f}s ({result['speedup']:.1f}x real time), "
+          f"{result['stalls']} stalls, final state {result['final_state']}")
+    print(result['mailbox'])
+    print(result['velocity'])
+    print(result['latency'])
+    print(f"{len(result['cmd_vel'])} cmd_vel, {len(result['score_tracker'])} score_tracker messages")
+    for message in result['score_tracker']:
+        print(f"  {message['t']:.2f}s {message['data']}")
+    if result['error'] is not None:
+        print('control loop failed: ' + result['error'])
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+    sys.exit(1 if result['error'] is not None else 0)
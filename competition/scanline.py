@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+
+import numpy as np
+
+
+def row_edges(row):
+    """
+    Finds the left and right road line pixels in one row of a mask.
+
+    Args:
+        row (numpy.ndarray): One row of a binary mask, 255 where a road line is.
+
+    Returns:
+        tuple: (left_index, right_index), the first and last 255 pixels. left_index is -1 if the
+               row has no line pixels, right_index is -1 if it has fewer than two.
+    """
+    hits = np.flatnonzero(row == 255)
+    if hits.size == 0:
+        return -1, -1
+    if hits.size == 1:
+        return int(hits[0]), -1
+    return int(hits[0]), int(hits[-1])
+
+
+def band_edges(band):
+    """
+    Finds the left and right road line pixels of every row of a band of mask rows at once.
+
+    Args:
+        band (numpy.ndarray): Rows of a binary mask, 255 where a road line is.
+
+    Returns:
+        tuple: (left, right) integer arrays with one entry per row, following the same -1
+               conventions as row_edges.
+    """
+    hits = band == 255
+    width = hits.shape[1]
+    count = np.count_nonzero(hits, axis=1)
+    left = np.where(count > 0, np.argmax(hits, axis=1), -1)
+    right = np.where(count > 1, width - 1 - np.argmax(hits[:, ::-1], axis=1), -1)
+    return left, right
+
+
+def fit_centre(rows, centres, ref_row, degree=1, max_outlier=80):
+    """
+    Fits a low order polynomial x(y) through the road centres found on several rows.
+
+    Rows further than max_outlier pixels from the median centre are dropped before the fit, so
+    one glitched row (a pedestrian, the truck, a magenta line) can't flip the result.
+
+    Args:
+        rows (numpy.ndarray): The y coordinate of each row with a road centre.
+        centres (numpy.ndarray): The road centre x coordinate on each of those rows.
+        ref_row (int): The y coordinate to evaluate the fit at.
+        degree (int): The polynomial degree, 1 for a straight lane.
+        max_outlier (float): Maximum distance in pixels from the median centre.
+
+    Returns:
+        float or None: The fitted x at ref_row, None if too few rows are left to fit.
+    """
+    if rows.size < degree + 2:
+        return None
+    keep = np.abs(centres - np.median(centres)) <= max_outlier
+    rows = rows[keep]
+    centres = centres[keep]
+    if rows.size < degree + 2:
+        return None
+    coeffs = np.polyfit(rows, centres, degree)
+    return float(np.polyval(coeffs, ref_row))
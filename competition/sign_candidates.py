@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+
+import heapq
+import itertools
+import math
+
+import cv2
+
+
+class SignCandidateBuffer():
+    """
+    Keeps the best few crops of the sign currently in view.
+
+    Each new crop is scored on a small grayscale copy by its size, sharpness and aspect ratio, and
+    only the top `capacity` crops are kept. Crops wider than `max_width` are shrunk before they
+    are stored, so the buffer never holds more than capacity * max_width * max_width / aspect
+    pixels.
+    """
+    def __init__(self, capacity=3, max_width=600, score_width=120):
+        self.capacity = capacity
+        self.max_width = max_width
+        self.score_width = score_width # width of the grayscale copy used for scoring
+
+        self.target_aspect = 1.5 # width / height of a sign seen straight on
+        self.full_area = 400 * 600 # crop area that gets the full size score
+        self.sharpness_half = 200.0 # laplacian variance that gets half the sharpness score
+        self.size_weight = 1.0
+        self.sharpness_weight = 1.0
+        self.aspect_weight = 0.5
+
+        self.heap = [] # min heap of (score, order, crop), the worst kept crop is heap[0]
+        self.order = itertools.count()
+
+    def score(self, sign):
+        """
+        Scores a sign crop, higher is better.
+
+        Args:
+            sign (numpy.ndarray): The BGR sign crop.
+
+        Returns:
+            float: The weighted sum of the size, sharpness and aspect ratio scores, each in [0, 1].
+        """
+        h, w = sign.shape[:2]
+        small = cv2.resize(sign, (self.score_width, max(1, self.score_width * h // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+
+        size_score = min(w * h / self.full_area, 1.0)
+        sharpness_score = sharpness / (sharpness + self.sharpness_half)
+        aspect_score = math.exp(-abs(math.log(w / h / self.target_aspect)))
+        return (self.size_weight * size_score + self.sharpness_weight * sharpness_score
+                + self.aspect_weight * aspect_score)
+
+    def add(self, sign):
+        """
+        Offers a crop to the buffer.
+
+        Args:
+            sign (numpy.ndarray): The BGR sign crop.
+
+        Returns:
+            bool: True if the crop is now one of the kept candidates.
+        """
+        h, w = sign.shape[:2]
+        if h == 0 or w == 0:
+            return False
+        score = self.score(sign)
+        if len(self.heap) == self.capacity and score <= self.heap[0][0]:
+            return False
+        if w > self.max_width:
+            sign = cv2.resize(sign, (self.max_width, self.max_width * h // w), interpolation=cv2.INTER_AREA)
+        entry = (score, next(self.order), sign)
+        if len(self.heap) < self.capacity:
+            heapq.heappush(self.heap, entry)
+        else:
+            heapq.heapreplace(self.heap, entry)
+        return True
+
+    # returns the kept crops, best first
+    def top(self):
+        return [sign for _, _, sign in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def best(self):
+        return max(self.heap, key=lambda entry: entry[:2])[2] if self.heap else None
+
+    def clear(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
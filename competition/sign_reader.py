@@ -1,40 +1,79 @@
 #! /usr/bin/env python3
 
+import hashlib
+import threading
+import time
+
 import rospy
 import cv2
 import numpy as np
-from cv_bridge import CvBridge
 from sensor_msgs.msg import Image
 from geometry_msgs.msg import Twist
 
+import blobs
+import frame_context
+import frame_decoder
+import frame_mailbox
 import image_treatment
-
-import tensorflow as tf
-from tensorflow import keras as ks
-from tensorflow.python.keras.backend import set_session
-from tensorflow.python.keras.models import load_model
-
-# sess1 = tf.compat.v1.Session()   
-# graph1 = tf.compat.v1.get_default_graph()
-# set_session(sess1)
-# tf.saved_model.LoadOptions(experimental_io_device = "/job:localhost")
+import letter_backends
+import scanline
+import sign_candidates
+import sign_worker
+import visualization
 
 
 class SignReader():
-    def __init__(self):
+    def __init__(self, mailbox=None):
         #rospy.init_node('sign_reader')
 
-        self.bridge = CvBridge()
-        rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback)
+        # frames come from the driver's camera subscription when it shares its mailbox, 
+        # otherwise the reader subscribes on its own
+        self.mailbox = mailbox
+        if self.mailbox is None:
+            self.mailbox = frame_mailbox.FrameMailbox()
+            self.decoder = frame_decoder.FrameDecoder()
+            self.seq = 0
+            rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback, queue_size=1, buff_size=2**24)
 
         self.vel_pub = rospy.Publisher('/R1/cmd_vel', Twist, queue_size=1)
 
-        self.img = None
         self.min_sign_area = 6000
 
-        self.path = '/home/fizzer/broda_data/my_model05'
-        self.nn = load_model(self.path)
+        # sign search regions per driver state as (x_min, y_min, x_max, y_max) fractions of the 
+        # frame, states not listed search the whole frame
+        self.sign_search_regions = {
+            'road': (0.0, 0.0, 1.0, 1.0),
+            'truck': (0.0, 0.0, 1.0, 1.0),
+            'desert': (0.0, 0.0, 1.0, 1.0),
+            'yoda': (0.0, 0.0, 1.0, 1.0),
+            'tunnel': (0.0, 0.0, 1.0, 1.0),
+            'mountain top': (0.0, 0.0, 1.0, 1.0),
+        }
+        self.sign_coarse_to_fine = False # may pick or clip a different blob, see the 'signs' benchmark
+        self.sign_coarse_step = 4 # subsampling of the coarse pass
+        self.sign_coarse_pad = 16 # pixels added around the coarse blob before the full resolution pass
+        self.sign_coarse_area_ratio = 0.5 # coarse blobs smaller than this fraction of min_sign_area are dropped
+
+        # 'keras' for the SavedModel, 'numpy' for weights exported by letter_backends.py
+        self.backend = rospy.get_param('~letter_backend', 'keras')
+        self.path = rospy.get_param('~model_path', '/home/fizzer/broda_data/my_model05')
+        self.weights_path = rospy.get_param('~weights_path', '/home/fizzer/broda_data/my_model05.npz')
         self.letter_check_num = 10
+        self.predict_batch_size = 128 # max number of letter crops sent to the network in one pass
+
+        # adaptive test-time augmentation, trimmed crops only run when the full crop is unsure
+        self.adaptive_tta = True
+        self.tta_min_confidence = 0.999 # same threshold the letter vote accepts a crop at
+        self.tta_min_margin = 0.5 # minimum gap between the top two class probabilities
+        self.letters_read = 0
+        self.letter_inferences = 0
+
+        # the model is loaded and warmed up in the background so the driver can start right away
+        self.nn = None
+        self.load_error = None # why the model failed to load, reads raise instead of waiting forever
+        self.model_ready = threading.Event()
+        self.load_thread = threading.Thread(target=self.load_model, name='model_loader', daemon=True)
+        self.load_thread.start()
         
         self.num_pixels_above_bottom = 200
         self.kp = 5
@@ -43,63 +82,149 @@ class SignReader():
         self.no_lines_error = 1000
         
         self.signs = []
+        self.sign_candidates = [] # best few crops of each stored sign, best first, indexed by sign id
+        self.sign_hashes = [] # content hash of the candidates of each stored sign, indexed by sign id
+        self.read_cache = {} # content hash -> finished prediction
         self.sign_img = None
+        self.candidates = sign_candidates.SignCandidateBuffer(capacity=3) # crops of the sign in view
 
         self.num_signs = 0
 
         self.firstSignTime = None
         self.durationBetweenSigns = rospy.Duration.from_sec(3)
 
+        self.read_in_background = True # read each sign as soon as it is stored
+        self.worker = sign_worker.SignWorker(self) if self.read_in_background else None
+
+    def load_model(self):
+        """
+        Loads the letter classifier and runs a dummy batch through it so the first real 
+        prediction is not slow. Runs on a background thread and sets model_ready when done, 
+        also when loading failed.
+
+        Returns:
+            None
+        """
+        start_time = time.perf_counter()
+        path = self.path if self.backend == 'keras' else self.weights_path
+        try:
+            nn = letter_backends.load_backend(self.backend, path)
+            load_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            nn.predict(np.zeros((self.predict_batch_size, 90, 60, 1), dtype=np.uint8))
+            warmup_time = time.perf_counter() - start_time
+            self.nn = nn
+        except Exception as e: # waiters are woken up either way, they raise on load_error
+            self.load_error = e
+            print('could not load letter model from ' + path + ': ' + str(e))
+            return
+        finally:
+            self.model_ready.set()
+        if self.backend == 'keras':
+            print(f'tensorflow import: {nn.import_time:.2f}s, model load: {nn.load_time:.2f}s, '
+                  f'warmup: {warmup_time:.2f}s')
+        else:
+            print(f'model load: {load_time:.3f}s, warmup: {warmup_time:.3f}s')
+
     # callback function for robot camera feed 
     def callback(self, msg):
-        self.img = self.bridge.imgmsg_to_cv2(msg, 'bgr8')
+        self.seq += 1
+        now = rospy.Time.now().to_sec()
+        stamp = msg.header.stamp.to_sec() or now
+        self.mailbox.put(self.decoder.decode_frame(msg, self.seq, stamp, now))
         
-    def check_if_sign(self, img):
+    def sign_mask(self, frame, x0, y0, x1, y1):
+        """
+        Thresholds a region of the frame for the white of a sign that is not blue, using the 
+        'sign_blue' and 'sign_white' colour classes.
+
+        Args:
+            frame (FrameContext): The camera frame.
+            x0, y0, x1, y1 (int): The region, in frame pixels.
+
+        Returns:
+            numpy.ndarray: The combined sign mask of the region.
+        """
+        blue_mask = frame.region_mask('sign_blue', x0, y0, x1, y1)
+        white_mask = frame.region_mask('sign_white', x0, y0, x1, y1)
+        return cv2.bitwise_and(cv2.bitwise_not(blue_mask), white_mask)
+
+    def find_sign_box(self, frame, x0, y0, x1, y1):
+        """
+        Coarse pass of the sign search: thresholds a subsampled copy of the search region and 
+        returns a padded box around the largest blob, in full resolution coordinates.
+
+        Args:
+            frame (FrameContext): The camera frame.
+            x0, y0, x1, y1 (int): The search region.
+
+        Returns:
+            tuple or None: (x0, y0, x1, y1) of the box to search at full resolution, None if no 
+                           blob could be big enough to be a sign.
+        """
+        step = self.sign_coarse_step
+        small = frame_context.FrameContext(np.ascontiguousarray(frame.img[y0:y1:step, x0:x1:step]))
+        small_height, small_width = small.shape[:2]
+        mask = self.sign_mask(small, 0, 0, small_width, small_height)
+        coarse_blobs = blobs.Blobs(mask)
+        if len(coarse_blobs) == 0:
+            return None
+        largest = coarse_blobs.largest()
+        if coarse_blobs.areas[largest] * step * step < self.sign_coarse_area_ratio * self.min_sign_area:
+            return None
+        x, y, w, h = coarse_blobs.box(largest)
+        pad = self.sign_coarse_pad
+        return (max(x0, x0 + x * step - pad), max(y0, y0 + y * step - pad),
+                min(x1, x0 + (x + w) * step + pad), min(y1, y0 + (y + h) * step + pad))
+
+    def check_if_sign(self, img, state=None):
         """
         Checks if a sign is present in the provided image.
 
+        Only the search region of the current state is looked at. With coarse-to-fine search on,
+        a subsampled pass finds the largest candidate blob first, and the full resolution 
+        thresholding and corner fitting only run inside a padded box around it.
+
         Args:
-            img (numpy.ndarray): The image in which to check for a sign.
+            img (numpy.ndarray or FrameContext): The image in which to check for a sign.
+            state (str, optional): The driver state, selects the search region.
 
         Returns:
             numpy.ndarray or None: The cropped image of the sign scaled and true size if found, None otherwise.
         """
+        frame = frame_context.wrap(img)
+        img = frame.img
         height, width = img.shape[:2]
 
-        # threshold camera image for blue
-        lower_hsv = (5,20,0)
-        upper_hsv = (150,255,255)
-        hsv_img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        blue_mask = cv2.inRange(hsv_img, lower_hsv, upper_hsv)
-
-        # threshold camera image for white
-        gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        sign_mask1 = cv2.inRange(gray_img, 95, 105)
-        sign_mask2 = cv2.inRange(gray_img, 195, 205)
-        sign_mask3 = cv2.inRange(gray_img, 115, 125)
-        sign_mask = cv2.bitwise_or(sign_mask1, sign_mask2)
-        sign_mask = cv2.bitwise_or(sign_mask, sign_mask3)
-
-        # combine masks
-        blue_mask_not = cv2.bitwise_not(blue_mask)
-        combined_mask = cv2.bitwise_and(blue_mask_not, sign_mask)
-
-        # find largest contour in the combined mask image
-        contours, hierarchy = cv2.findContours(combined_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours.__len__() == 0: # return None if no contours are found
+        # search region of the state, as fractions of the frame
+        fx0, fy0, fx1, fy1 = self.sign_search_regions.get(state, (0.0, 0.0, 1.0, 1.0))
+        x0, y0, x1, y1 = int(fx0 * width), int(fy0 * height), int(fx1 * width), int(fy1 * height)
+        if self.sign_coarse_to_fine:
+            box = self.find_sign_box(frame, x0, y0, x1, y1)
+            if box is None:
+                return None
+            x0, y0, x1, y1 = box
+
+        combined_mask = self.sign_mask(frame, x0, y0, x1, y1)
+
+        # find largest contour in the combined mask image, in full frame coordinates
+        sign_blobs = blobs.Blobs(combined_mask, offset=(x0, y0))
+        if len(sign_blobs) == 0: # return None if no contours are found
             # print('no sign detected - no contours')
             return None
-        largest_contour = max(contours, key=cv2.contourArea)
+        largest = sign_blobs.largest()
+        largest_contour = sign_blobs.contours[largest]
 
         # filter out contours that are too small
-        area = cv2.contourArea(largest_contour)
+        area = sign_blobs.areas[largest]
         if area < self.min_sign_area:
             # print('no sign detected - too small')
             return None
 
         # find the corners of the sign
-        x, y, w, h = cv2.boundingRect(largest_contour)
-        epsilon = 0.02 * cv2.arcLength(largest_contour, True)
+        x, y, w, h = sign_blobs.box(largest)
+        epsilon = 0.02 * sign_blobs.perimeters[largest]
         approx_polygon = cv2.approxPolyDP(largest_contour, epsilon, True)
 
         corners = [point[0] for point in approx_polygon]
@@ -154,28 +279,71 @@ class SignReader():
     
     def compare_sign(self, new_sign):
         """
-        Compares the new sign image to the currently stored sign image. If the new image is 
-        larger, it replaces the stored image.
+        Offers the new sign image to the candidate buffer of the sign in view. The best scoring 
+        candidate becomes the stored sign image.
 
         Args:
-            new_sign (numpy.ndarray): The new sign image to compare with the currently stored sign image.
+            new_sign (numpy.ndarray): The new sign image to compare with the kept candidates.
 
         Returns:
             None
         """
-        if self.sign_img is None: # if stored sign image hasn't been assigned yet, assign it
-            self.sign_img = new_sign
+        if self.sign_img is None: # if stored sign image hasn't been assigned yet, start the timer
+            self.candidates.clear()
+            self.candidates.add(new_sign)
+            self.sign_img = self.candidates.best()
             self.firstSignTime = rospy.Time.now() # start timer for reading sign
             print('assigned sign image and timer started')
-        else:
-            if new_sign.size > self.sign_img.size: # compare size of new sign to stored sign
-                if new_sign.shape[1] >= self.sign_img.shape[1]:
-                    self.sign_img = new_sign
-                    cv2.imshow("sign", self.sign_img)
-                    cv2.waitKey(1)
-                    print('bigger sign found')
+        elif self.candidates.add(new_sign):
+            best = self.candidates.best()
+            if best is not self.sign_img:
+                self.sign_img = best
+                visualization.sink.show("sign", self.sign_img)
+                print('better sign found')
         return
-    
+
+    # stores the candidates of the sign in view once its reading window has closed
+    def finish_sign(self):
+        sign_id = self.add_sign(self.sign_img, self.candidates.top())
+        self.candidates.clear()
+        self.sign_img = None
+        self.firstSignTime = None
+        return sign_id
+
+    def sign_hash(self, candidates):
+        """
+        Computes a content hash of the candidate crops of a sign, used as the key of the read cache.
+
+        Args:
+            candidates (list of numpy.ndarray): The candidate crops of the sign.
+
+        Returns:
+            str: The hex digest of the shape and pixel data of every candidate.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for sign in candidates:
+            digest.update(str(sign.shape).encode())
+            digest.update(np.ascontiguousarray(sign).data)
+        return digest.hexdigest()
+
+    # stores a finished sign, queues it for a background read and returns its id, which is 
+    # its index in self.signs
+    def add_sign(self, sign, candidates=None):
+        candidates = candidates or [sign]
+        self.signs.append(sign)
+        self.sign_candidates.append(candidates)
+        self.sign_hashes.append(self.sign_hash(candidates))
+        self.num_signs += 1
+        if self.worker is not None:
+            self.worker.submit(self.num_signs - 1)
+        return self.num_signs - 1
+
+    # reads every stored sign, only running the network on signs without a cached read
+    def read_stored_signs(self):
+        if self.worker is not None:
+            self.worker.wait() # let in-flight background reads land in the cache first
+        return self.read_signs(self.sign_candidates[:self.num_signs], self.sign_hashes[:self.num_signs])
+
     def num_to_alphanum(self, x):
         if x <= 25:
             return chr(x + 65)
@@ -185,109 +353,204 @@ class SignReader():
     # when enough time has elapsed from initial sign detection, get the letters from the best 
     # sign image and send them to the neural network
     def read_sign(self, sign):
-        #cv2.imshow("sign "+str(self.num_signs), self.sign_img)
-        #cv2.waitKey(1)
-        clue = image_treatment.signToLetters(sign)
-        preds = []
-        for i in range(clue.shape[0]):
-            img = clue[i]
-            h, w = img.shape[:2]
-            imgs = []
-            possibly = []
-            imgs.append(self.edit_letter(img, h, 0, w))
-            #imgs.append(self.edit_letter(img, h, 0, int(w*7/8)))
-            #imgs.append(self.edit_letter(img, h, int(w*1/8), w))
-            #imgs.append(self.edit_letter(img, h, int(w*1/8), int(w*7/8)))
-            imgs.append(self.edit_letter(img, h, 0, int(w*8/9)))
-            imgs.append(self.edit_letter(img, h, int(w*1/9), w))
-            imgs.append(self.edit_letter(img, h, int(w*1/9), int(w*8/9)))
-            
-            for edit in imgs:
-                possibly.append(self.predict_letter(edit))
-            possibly.append(self.predict_letter(imgs[0]))
-            possibly = sorted(possibly, key=lambda c: c[1])
-            possibly_weighted = []
-            omit_vals = []
-            pos_vals = []
-            pos_conf = []
-            '''
-            for j in range(len(possibly)):
-                if possibly[j][1] == 1:
-                    possibly_weighted.append(possibly[j][0])
-                    possibly_weighted.append(possibly[j][0])
-                if possibly[j][1] > 0.999 and possibly[j][1] < 1:                    
-                    possibly_weighted.append(possibly[j][0])
-                if possibly[j][1] < 0.6: 
-                    omit_vals.append(possibly[j][0])
-                print(possibly[j])
-            for o in omit_vals:
-                possibly_weighted = [k for k in possibly_weighted if i != o] 
-            if len(possibly_weighted) == 0:
-                possibly_weighted.append(possibly[-1])
-            predict = max(set(possibly_weighted), key=possibly_weighted.count)
-            for p in possibly_weighted:
-                print(p)
-                '''
-            for j in possibly:
-                print(j)
-                if j[1] == 1:
-                    j = (j[0],3)
-                if j[1] > 0.999:
-                    if j[0] in pos_vals:
-                        ind = pos_vals.index(j[0])
-                        pos_conf[ind] = pos_conf[ind] + j[1]
-                    else:
-                        pos_vals.append(j[0])
-                        pos_conf.append(j[1])
-            if len(pos_vals) == 0:
-                predict = possibly[-1][0]
-            else:
-                max_ind = np.argmax(pos_conf)
-                predict = pos_vals[max_ind]
-
-            preds.append(predict)
-            
-        prediction = ''.join(preds)
-        print(str(prediction))
-        return prediction
-    
-    def edit_letter(self, img, h, wstart, wend):
+        return self.read_signs([[sign]])[0]
+
+    def read_signs(self, signs, hashes=None):
+        """
+        Reads every letter of every provided sign with batched neural network inference.
+
+        Signs with a cached read are looked up instead of read again. The full width crops of 
+        all letters of all candidates of the remaining signs are stacked into a single tensor and
+        classified in fixed-size chunks. The trimmed test-time crops of every letter (or, with 
+        adaptive_tta, only of letters the full crop is unsure about) go through a second batch, 
+        then the predictions are scattered back to each letter for voting. The reads of the 
+        candidates of a sign are merged letter by letter.
+
+        Args:
+            signs (list of list of numpy.ndarray): The candidate crops of each sign, best first.
+            hashes (list of str, optional): The precomputed content hash of each sign.
+
+        Returns:
+            list of str: The predicted clue for each sign, in the same order as signs.
+        """
+        if hashes is None:
+            hashes = [self.sign_hash(sign) for sign in signs]
+        uncached = [i for i, key in enumerate(hashes) if key not in self.read_cache]
+        if len(uncached) != 0:
+            predictions = self.run_read(signs[i] for i in uncached)
+            for i, prediction in zip(uncached, predictions):
+                self.read_cache[hashes[i]] = prediction
+        return [self.read_cache[key] for key in hashes]
+
+    # reads the signs without the cache, see read_signs
+    def run_read(self, signs):
+        start_time = time.perf_counter()
+        signs = list(signs)
+        images = [img for candidates in signs for img in candidates]
+
+        letters = []
+        letter_counts = []
+        for sign in images:
+            try:
+                clue = image_treatment.signToLetters(sign)
+            except Exception as e: # a bad candidate crop is skipped, the others still count
+                print('could not split sign into letters: ' + str(e))
+                clue = np.zeros((0, 90, 60), dtype=np.uint8)
+            letter_counts.append(clue.shape[0])
+            letters.extend(clue[i] for i in range(clue.shape[0]))
+
+        num_letters = len(letters)
+        if num_letters == 0:
+            return ['' for _ in signs]
+
+        # classify the full width crop of every letter first
+        full_crops = [self.crop_letter(img, img.shape[0], 0, img.shape[1]) for img in letters]
+        full_yps = self.predict_letters(np.stack(full_crops))
+        possibilities = [[self.decode_letter(yp)] for yp in full_yps]
+        num_inferences = num_letters
+
+        # only run the trimmed crops on letters the full crop wasn't sure about
+        unsure = [i for i, yp in enumerate(full_yps) if not (self.adaptive_tta and self.is_confident(yp))]
+        if len(unsure) != 0:
+            variants = [crop for i in unsure for crop in self.letter_variants(letters[i])]
+            variant_yps = self.predict_letters(np.stack(variants))
+            num_variants = variant_yps.shape[0] // len(unsure)
+            for k, i in enumerate(unsure):
+                letter_yps = variant_yps[k * num_variants:(k + 1) * num_variants]
+                possibilities[i].extend(self.decode_letter(yp) for yp in letter_yps)
+            num_inferences += variant_yps.shape[0]
+
+        reads = []
+        letter_ind = 0
+        for count in letter_counts:
+            preds = []
+            for possibly in possibilities[letter_ind:letter_ind + count]:
+                possibly.append(possibly[0]) # full width crop counts twice
+                preds.append(self.vote_letter(possibly))
+            letter_ind += count
+            reads.append(''.join(preds))
+
+        predictions = []
+        read_ind = 0
+        for candidates in signs:
+            prediction = self.merge_reads(reads[read_ind:read_ind + len(candidates)])
+            read_ind += len(candidates)
+            print(str(prediction))
+            predictions.append(prediction)
+
+        self.letters_read += num_letters
+        self.letter_inferences += num_inferences
+        elapsed = time.perf_counter() - start_time
+        print(f'read {num_letters} letters from {len(signs)} signs in {elapsed:.3f}s '
+              f'({num_letters / elapsed:.1f} letters/sec, '
+              f'{self.letter_inferences / self.letters_read:.2f} inferences/letter overall)')
+        return predictions
+
+    # merges the reads of the candidates of one sign, best candidate first. Candidates that read
+    # a different number of letters than most others are dropped, then each letter is a majority
+    # vote with ties going to the better candidate
+    def merge_reads(self, reads):
+        reads = [read for read in reads if len(read) != 0]
+        if len(reads) == 0:
+            return ''
+        lengths = [len(read) for read in reads]
+        length = max(lengths, key=lengths.count)
+        reads = [read for read in reads if len(read) == length]
+        letters = []
+        for i in range(length):
+            column = [read[i] for read in reads]
+            letters.append(max(column, key=column.count))
+        return ''.join(letters)
+
+    # returns true if a prediction is good enough to skip the trimmed crops
+    def is_confident(self, yp):
+        second, first = np.partition(yp, -2)[-2:]
+        return first >= self.tta_min_confidence and first - second >= self.tta_min_margin
+
+    # returns the trimmed test-time crops of a letter, used when the full width crop is unsure
+    def letter_variants(self, img):
+        h, w = img.shape[:2]
+        crops = []
+        #crops.append(self.crop_letter(img, h, 0, int(w*7/8)))
+        #crops.append(self.crop_letter(img, h, int(w*1/8), w))
+        #crops.append(self.crop_letter(img, h, int(w*1/8), int(w*7/8)))
+        crops.append(self.crop_letter(img, h, 0, int(w*8/9)))
+        crops.append(self.crop_letter(img, h, int(w*1/9), w))
+        crops.append(self.crop_letter(img, h, int(w*1/9), int(w*8/9)))
+        return crops
+
+    # picks the letter from a list of (letter, confidence) predictions of the same letter
+    def vote_letter(self, possibly):
+        possibly = sorted(possibly, key=lambda c: c[1])
+        pos_vals = []
+        pos_conf = []
+        for j in possibly:
+            print(j)
+            if j[1] == 1:
+                j = (j[0],3)
+            if j[1] > 0.999:
+                if j[0] in pos_vals:
+                    ind = pos_vals.index(j[0])
+                    pos_conf[ind] = pos_conf[ind] + j[1]
+                else:
+                    pos_vals.append(j[0])
+                    pos_conf.append(j[1])
+        if len(pos_vals) == 0:
+            return possibly[-1][0]
+        max_ind = np.argmax(pos_conf)
+        return pos_vals[max_ind]
+
+    def crop_letter(self, img, h, wstart, wend):
         img = img[0:h, wstart:wend]
         img = cv2.resize(img, (60,90), interpolation= cv2.INTER_LINEAR)
-        img_aug = np.expand_dims(img, axis=0)
-        letter = tf.expand_dims(img_aug, axis=-1)
-        return letter
-    
-    def predict_letter(self, img):
-        yp = self.nn.predict(img)[0]
+        return np.expand_dims(img, axis=-1)
+
+    def edit_letter(self, img, h, wstart, wend):
+        letter = self.crop_letter(img, h, wstart, wend)
+        return np.expand_dims(letter, axis=0)
+
+    # blocks until the background load finished, raises if it failed
+    def wait_for_model(self):
+        self.model_ready.wait()
+        if self.nn is None:
+            raise RuntimeError('letter model not loaded: ' + str(self.load_error))
+
+    # runs the network over a stack of letter crops in chunks of predict_batch_size
+    def predict_letters(self, letters):
+        self.wait_for_model()
+        yps = []
+        for i in range(0, letters.shape[0], self.predict_batch_size):
+            chunk = letters[i:i + self.predict_batch_size]
+            yps.append(self.nn.predict(chunk))
+        return np.concatenate(yps, axis=0)
+
+    def decode_letter(self, yp):
         predict_ind = np.argmax(yp)
         pred = self.num_to_alphanum(int(predict_ind))
         confidence = yp[predict_ind]
         return (pred, confidence)
+
+    def predict_letter(self, img):
+        self.wait_for_model()
+        yp = self.nn.predict(img)[0]
+        return self.decode_letter(yp)
     
     def find_road_centre(self, img, y):
         """
         This method finds the centre of the road in an image.
 
         Args:
-            img (numpy.ndarray): The input image, in BGR format.
+            img (numpy.ndarray or FrameContext): The input image, in BGR format.
             y (int): The y-coordinate from the bottom of the image to find the road centre.
 
         Returns:
             road_centre (int): The x-coordinate of the road centre, -1 if no road lines are detected.
         """
-        height, width = img.shape[:2]
-        gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        white_mask = cv2.inRange(gray_img, 250, 255)
-
-        left_index = -1
-        right_index = -1
-
-        for i in range(width):
-            if white_mask[height - y, i] == 255 and left_index == -1:
-                left_index = i
-            elif white_mask[height - y, i] == 255 and left_index != -1:
-                right_index = i
+        frame = frame_context.wrap(img)
+        height, width = frame.shape[:2]
+        # only the row the road centre is read from is converted and thresholded
+        white_mask = frame.region_mask('road_white', 0, height - y, width, height - y + 1)
+        left_index, right_index = scanline.row_edges(white_mask[0])
 
         road_centre = -1
         if left_index != -1 and right_index != -1:
@@ -301,9 +564,8 @@ class SignReader():
             print('no road lines detected')
             road_centre = -1
 
-        if road_centre != -1:
-            cv2.imshow('camera feed', cv2.circle(img, (road_centre, height - y), 5, (0, 0, 255), -1))
-            cv2.waitKey(1)
+        if road_centre != -1 and visualization.sink.enabled:
+            visualization.sink.show('camera feed', cv2.circle(img.copy(), (road_centre, height - y), 5, (0, 0, 255), -1))
 
         return road_centre
     
@@ -312,7 +574,7 @@ class SignReader():
         This method calculates the error between the centre of the road and the centre of the image.
 
         Args:
-            img (numpy.ndarray): The input image, in BGR format.
+            img (numpy.ndarray or FrameContext): The input image, in BGR format.
 
         Returns:
             error (int): The x coordinate difference between the road centre and the centre of the image, 1000 if no road lines are detected.
@@ -328,11 +590,12 @@ class SignReader():
     def run(self):
         while not rospy.is_shutdown():
             # check if robot camera feed sees a sign
-            if self.img is not None:
-                cropped_img, cropped_img_true = self.check_if_sign(self.img) # returns None if no sign detected
+            frame = self.mailbox.latest()
+            if frame is not None:
+                cropped_img, cropped_img_true = self.check_if_sign(frame) # returns None if no sign detected
                 if cropped_img is not None:
                     self.compare_sign(cropped_img) # changes self.sign_img if new sign is larger
-                error = self.kp * self.get_error(self.img)
+                error = self.kp * self.get_error(frame.img)
                 move = Twist()
                 if error != self.kp * self.no_lines_error:
                     move.linear.x = self.lin_speed
@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+
+import queue
+import threading
+
+
+class SignWorker():
+    """
+    Reads finished signs on a background thread so OCR runs while the robot keeps driving.
+
+    Sign ids are fed through a bounded queue. Each read goes through SignReader.read_signs, so
+    the prediction lands in the reader's read cache and clue submission only has to look it up.
+    """
+    def __init__(self, reader, max_pending=4):
+        self.reader = reader
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self.run, name='sign_worker', daemon=True)
+        self.thread.start()
+
+    def submit(self, sign_id):
+        """
+        Queues a stored sign to be read in the background.
+
+        Args:
+            sign_id (int): The id of the stored sign to read.
+
+        Returns:
+            bool: True if the sign was queued, False if the queue is full and the sign will be
+                  read at submission time instead.
+        """
+        try:
+            self.queue.put_nowait(sign_id)
+        except queue.Full:
+            print('sign worker busy, sign ' + str(sign_id + 1) + ' will be read at submission')
+            return False
+        return True
+
+    # blocks until every queued sign has been read
+    def wait(self):
+        self.queue.join()
+
+    def run(self):
+        while True:
+            sign_id = self.queue.get()
+            try:
+                candidates = self.reader.sign_candidates[sign_id]
+                sign_hash = self.reader.sign_hashes[sign_id]
+                prediction = self.reader.read_signs([candidates], [sign_hash])[0]
+                print('background read of sign ' + str(sign_id + 1) + ': ' + prediction)
+            except Exception as e: # a bad crop must not kill the worker, it gets read again at submission
+                print('background read of sign ' + str(sign_id + 1) + ' failed: ' + str(e))
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+
+import threading
+
+import rospy
+from geometry_msgs.msg import Twist
+
+
+class VelocityPublisher():
+    """
+    Publishes velocity commands from its own thread at a fixed rate.
+
+    The control loop only sets a target. Big jumps in linear speed (more than speed_buffer) are
+    ramped towards at accel_rate / decel_rate per 1/accel_freq seconds, the same profile
+    drive_robot used to run inline. A ramp runs until it reaches the target, however close the
+    targets set meanwhile are. Like the inline ramp it sends no rotation: the target angular
+    speed only applies once the ramp is done, as it did on the next drive_robot call. Anything
+    else is applied on the next tick. A command is only published when it changed, or when
+    keepalive_period has passed since the last one. Each command is published together with
+    the frame its target was decided on.
+
+    With threaded off no thread is started, and whoever owns the clock (the replay harness)
+    calls tick once per 1/rate seconds instead.
+    """
+    def __init__(self, publish, rate=50, accel_rate=0.1, decel_rate=0.1, accel_freq=50,
+                 speed_buffer=1.3, keepalive_period=1.0, threaded=True):
+        self.publish = publish # called with each Twist, the frame it came from and True for keepalive repeats
+        self.rate = rate
+        self.accel_step = accel_rate * accel_freq / rate # same acceleration whatever the rate
+        self.decel_step = decel_rate * accel_freq / rate
+        self.speed_buffer = speed_buffer
+        self.keepalive_period = keepalive_period
+        self.change_tolerance = 1e-4
+
+        self.lock = threading.Condition()
+        self.active = False # nothing is published until the first target is set
+        self.target_linear = 0.0
+        self.target_angular = 0.0
+        self.target_frame = None # frame the target was decided on
+        self.ramping = False
+        self.linear = 0.0 # command currently being sent
+        self.angular = 0.0
+
+        self.sent_linear = None
+        self.sent_angular = None
+        self.last_publish_time = None
+        self.published = 0
+        self.suppressed = 0
+
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self.run, name='velocity_publisher', daemon=True)
+            self.thread.start()
+
+    def set_target(self, linear, angular, frame=None):
+        """
+        Sets the velocity to drive at and returns immediately.
+
+        Args:
+            linear (float): The target linear speed.
+            angular (float): The target angular speed.
+            frame (FrameContext): The frame the target was decided on, for latency tracing.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.active = True
+            self.target_linear = linear
+            self.target_angular = angular
+            self.target_frame = frame
+            # only big speed changes start a ramp, like the old blocking drive_robot. A running
+            # ramp carries on towards the new target, step ends it when the target is reached
+            if not self.ramping:
+                self.ramping = abs(linear - self.linear) > self.speed_buffer
+
+    # blocks until a ramp to the current target is done
+    def wait(self):
+        with self.lock:
+            while self.ramping and not rospy.is_shutdown():
+                self.lock.wait(1.0 / self.rate)
+
+    def step(self):
+        with self.lock:
+            if self.ramping:
+                if self.target_linear > self.linear:
+                    self.linear = min(self.linear + self.accel_step, self.target_linear)
+                else:
+                    self.linear = max(self.linear - self.decel_step, self.target_linear)
+                self.angular = 0.0 # no rotation during a ramp, like the old inline loop
+                if self.linear == self.target_linear:
+                    self.ramping = False
+                    self.lock.notify_all()
+            else:
+                self.linear = self.target_linear
+                self.angular = self.target_angular
+            return self.linear, self.angular, self.target_frame
+
+    def run(self):
+        rate = rospy.Rate(self.rate)
+        while not rospy.is_shutdown():
+            self.tick()
+            rate.sleep()
+
+    # one publisher period: steps towards the target and publishes the command if it is due.
+    # Publishing holds the lock, so a stop can't be overtaken by an older command
+    def tick(self):
+        with self.lock:
+            if not self.active:
+                return
+            linear, angular, frame = self.step()
+            now = rospy.get_time()
+            changed = (self.sent_linear is None
+                       or abs(linear - self.sent_linear) > self.change_tolerance
+                       or abs(angular - self.sent_angular) > self.change_tolerance)
+            if changed or now - self.last_publish_time >= self.keepalive_period:
+                self.send(linear, angular, frame, not changed, now)
+            else:
+                self.suppressed += 1
+
+    def send(self, linear, angular, frame, keepalive, now):
+        move = Twist()
+        move.linear.x = linear
+        move.angular.z = angular
+        self.publish(move, frame, keepalive)
+        self.sent_linear, self.sent_angular = linear, angular
+        self.last_publish_time = now
+        self.published += 1
+
+    def stop(self, frame=None):
+        """
+        Stops the robot before returning: publishes a zero command from the calling thread and
+        stops publishing until the next set_target. For leaving the control loop, when the
+        daemon publisher thread may not get another tick.
+
+        Args:
+            frame (FrameContext): The frame the stop was decided on, for latency tracing.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.active = False
+            self.ramping = False
+            self.target_linear = self.target_angular = 0.0
+            self.linear = self.angular = 0.0
+            self.target_frame = frame
+            self.send(0.0, 0.0, frame, False, rospy.get_time())
+            self.lock.notify_all()
+
+    def stats(self):
+        return f'{self.published} velocity commands published, {self.suppressed} unchanged suppressed'
@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+
+import collections
+import threading
+
+import cv2
+
+
+class VisualizationSink():
+    """
+    Shows debug images on a separate display thread so perception code never waits on the GUI.
+
+    Frames are handed over through a drop-oldest queue: when the display falls behind, the
+    oldest pending frames are discarded. The sink is off until enable is called, and show is a
+    no-op while it is off, so headless runs never touch the GUI.
+    """
+    def __init__(self, max_pending=8):
+        self.enabled = False
+        self.pending = collections.deque(maxlen=max_pending)
+        self.cond = threading.Condition()
+        self.thread = None
+        self.shown = 0
+        self.dropped = 0
+
+    def enable(self):
+        with self.cond:
+            self.enabled = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='visualization', daemon=True)
+                self.thread.start()
+
+    def disable(self):
+        with self.cond:
+            self.enabled = False
+            self.pending.clear()
+
+    def show(self, name, img):
+        """
+        Queues an image to be shown in the named window.
+
+        Args:
+            name (str): The window name.
+            img (numpy.ndarray): The image, copied so the caller can keep modifying it.
+
+        Returns:
+            None
+        """
+        if not self.enabled:
+            return
+        with self.cond:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append((name, img.copy()))
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                name, img = self.pending.popleft()
+            try:
+                cv2.imshow(name, img)
+                cv2.waitKey(1)
+                self.shown += 1
+            except cv2.error as e: # no display available, stop trying
+                print('visualization disabled: ' + str(e))
+                self.disable()
+
+
+sink = VisualizationSink()